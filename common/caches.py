@@ -0,0 +1,172 @@
+"""
+Copyright 2021-2024 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import asyncio
+import collections
+import time
+from collections import OrderedDict
+
+import interactions as ipy
+import typing_extensions as typing
+
+KT = typing.TypeVar("KT")
+VT = typing.TypeVar("VT")
+
+# every named cache, so that they can be shown in the debug cache command
+REGISTERED_CACHES: dict[str, "StatsTTLCache"] = {}
+
+
+class StatsTTLCache(ipy.utils.TTLCache[KT, VT]):
+    """
+    A TTL cache that keeps track of its hits and misses.
+
+    Unlike its parent, expired entries are never returned, even when the cache
+    is under its soft limit. Getting an entry moves it to the end of the cache,
+    so that the least recently used entries are the first to be evicted.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: int = 600,
+        hard_limit: int = 250,
+        *,
+        soft_limit: int = 0,
+        refresh_on_get: bool = False,
+    ) -> None:
+        super().__init__(ttl=ttl, soft_limit=soft_limit, hard_limit=hard_limit)
+        self.name = name
+        self.refresh_on_get = refresh_on_get
+        self.hits = 0
+        self.misses = 0
+
+        REGISTERED_CACHES[name] = self
+
+    def _get_item(self, key: KT) -> ipy.utils.TTLItem[VT] | None:
+        item: ipy.utils.TTLItem[VT] | None = OrderedDict.get(self, key)
+        if item is None:
+            return None
+
+        if item.is_expired(time.monotonic()):
+            OrderedDict.__delitem__(self, key)
+            return None
+
+        return item
+
+    def get(
+        self,
+        key: KT,
+        default: typing.Optional[VT] = None,
+        reset_expiration: typing.Optional[bool] = None,
+        *,
+        validate: typing.Optional[typing.Callable[[VT], bool]] = None,
+    ) -> typing.Optional[VT]:
+        """
+        Gets an entry from the cache, counting the attempt as a hit or miss.
+
+        Args:
+            key: The key of the entry.
+            default: What to return if there is no usable entry.
+            reset_expiration: Whether to reset the expiration of the entry. \
+                Defaults to the cache's own setting.
+            validate: If given, an entry that this returns false for is treated \
+                as a miss, though it is kept in the cache.
+
+        Returns:
+            The entry, or the default.
+        """
+        item = self._get_item(key)
+
+        if item is None or (validate is not None and not validate(item.value)):
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        self.move_to_end(key)
+
+        if reset_expiration or (reset_expiration is None and self.refresh_on_get):
+            item.expire = time.monotonic() + self.ttl
+
+        return item.value
+
+    def peek(self, key: KT) -> typing.Optional[VT]:
+        """Gets an unexpired entry without affecting stats or the eviction order."""
+        item = self._get_item(key)
+        return None if item is None else item.value
+
+    # the views of the parent go through get, which would count as hits and
+    # reorder the cache while it's being iterated over
+    def items(self) -> list[tuple[KT, VT]]:  # type: ignore
+        """Gets every unexpired entry without affecting stats or the eviction order."""
+        now = time.monotonic()
+        return [
+            (key, item.value)
+            for key, item in OrderedDict.items(self)
+            if not item.is_expired(now)
+        ]
+
+    def values(self) -> list[VT]:  # type: ignore
+        """Gets every unexpired value without affecting stats or the eviction order."""
+        return [value for _, value in self.items()]
+
+    def discard(self, key: KT) -> None:
+        self.pop(key, None)
+
+    def clear(self) -> None:
+        super().clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class LazyKeyedCache(typing.Generic[KT, VT]):
+    """
+    An in-memory cache whose entries are loaded one key at a time, when they're
+    first needed.
+
+    Only one load runs at a time for each key. A load that raced with an
+    invalidation of its key is returned but not stored, as it may be stale.
+    """
+
+    __slots__ = ("_entries", "_generations", "_loader", "_locks")
+
+    def __init__(self, loader: typing.Callable[[KT], typing.Awaitable[VT]]) -> None:
+        self._loader = loader
+        self._entries: dict[KT, VT] = {}
+        self._locks: collections.defaultdict[KT, asyncio.Lock] = (
+            collections.defaultdict(asyncio.Lock)
+        )
+        self._generations: collections.Counter[KT] = collections.Counter()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def peek(self, key: KT) -> typing.Optional[VT]:
+        """Gets an entry if it's loaded, without loading it otherwise."""
+        return self._entries.get(key)
+
+    async def get(self, key: KT) -> VT:
+        if (value := self._entries.get(key)) is not None:
+            return value
+
+        async with self._locks[key]:
+            if (value := self._entries.get(key)) is not None:
+                return value
+
+            generation = self._generations[key]
+            value = await self._loader(key)
+
+            if generation == self._generations[key]:
+                self._entries[key] = value
+
+        self._locks.pop(key, None)
+        return value
+
+    def invalidate(self, key: KT) -> None:
+        self._generations[key] += 1
+        self._entries.pop(key, None)
@@ -7,11 +7,15 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
+import asyncio
+
 import interactions as ipy
+import numpy as np
 import rapidfuzz
 import typing_extensions as typing
 from rapidfuzz import process
 
+import common.caches as caches
 import common.models as models
 
 if typing.TYPE_CHECKING:
@@ -19,33 +23,213 @@ if typing.TYPE_CHECKING:
 
 T = typing.TypeVar("T")
 
+# how long autocomplete waits on the database before giving up, as discord
+# only gives three seconds to respond
+AUTOCOMPLETE_FETCH_TIMEOUT: typing.Final[float] = 2.0
+# how many queries' results are remembered for each list of choices
+MAX_MEMOIZED_QUERIES: typing.Final[int] = 50
+# channels with more Truth Bullets than this are searched in the database
+# instead of having all of their Truth Bullets fetched
+MAX_BULLET_CHOICES: typing.Final[int] = 250
+
+
+# what choices are scored with if no scorers are given
+DEFAULT_SCORERS: typing.Final[tuple[typing.Callable, ...]] = (
+    rapidfuzz.distance.JaroWinkler.similarity,
+)
+
+
+def _score_choices(
+    query: str,
+    choices: typing.Sequence[str],
+    scorers: typing.Iterable[typing.Callable],
+    best_scores: np.ndarray,
+) -> None:
+    # the choices are already processed, so rapidfuzz doesn't need to
+    for scorer in scorers:
+        scores = process.cdist(
+            [query], choices, scorer=scorer, processor=None, dtype=np.float64
+        )
+        np.maximum(best_scores, scores[0], out=best_scores)
+
+
+def _best_matches(
+    best_scores: np.ndarray, score_cutoff: float, limit: int | None
+) -> np.ndarray:
+    (matches,) = np.nonzero(best_scores >= score_cutoff)
+    # stable, so that ties keep their original order
+    matches = matches[np.argsort(-best_scores[matches], kind="stable")]
+    if limit is not None:
+        matches = matches[:limit]
+    return matches
+
 
 def extract_from_list(
     argument: str,
-    list_of_items: typing.Collection[T],
+    list_of_items: typing.Sequence[T],
     processors: typing.Iterable[typing.Callable],
     score_cutoff: float = 0.8,
     scorers: typing.Iterable[typing.Callable] | None = None,
-) -> list[list[T]]:
-    """Uses multiple scorers and processors for a good mix of accuracy and fuzzy-ness"""
+    limit: int | None = 5,
+) -> list[tuple[T, float, int]]:
+    """
+    Uses multiple scorers and processors for a good mix of accuracy and fuzzy-ness.
+
+    Every item is scored against the argument with every scorer and processor
+    at once, and its best score is what's used.
+
+    Returns:
+        Up to `limit` tuples of the item, its score, and its index in the list,
+        best matches first.
+    """
     if scorers is None:
-        scorers = [rapidfuzz.distance.JaroWinkler.similarity]
-    combined_list = []
+        scorers = DEFAULT_SCORERS
+    if not list_of_items:
+        return []
+
+    best_scores = np.zeros(len(list_of_items), dtype=np.float64)
+
+    for processor in processors:
+        _score_choices(
+            processor(argument),
+            [processor(item) for item in list_of_items],
+            scorers,
+            best_scores,
+        )
 
-    for scorer in scorers:
-        for processor in processors:
-            if fuzzy_list := process.extract(
-                argument,
-                list_of_items,
-                scorer=scorer,
-                processor=processor,
-                score_cutoff=score_cutoff,
-            ):
-                combined_entries = [e[0] for e in combined_list]
-                new_members = [e for e in fuzzy_list if e[0] not in combined_entries]
-                combined_list.extend(new_members)
+    return [
+        (list_of_items[i], float(best_scores[i]), int(i))
+        for i in _best_matches(best_scores, score_cutoff, limit)
+    ]
+
+
+class AutocompleteChoices(typing.Generic[T]):
+    """
+    A list of choices for autocomplete, alongside the results of recent queries.
+
+    The choices are processed once when the list is made, so queries only
+    need to score them.
+
+    If there were too many choices to fetch them all, only the first of them
+    are kept and the list is marked as incomplete.
+    """
+
+    __slots__ = ("_processed", "_results", "complete", "items")
+
+    def __init__(
+        self,
+        items: list[T],
+        processor: typing.Callable[[T], str],
+        *,
+        complete: bool = True,
+    ) -> None:
+        self.items = items
+        self.complete = complete
+        self._processed = [processor(item) for item in items]
+        self._results: dict[str, list[T]] = {}
+
+    def match(self, query: str) -> list[T]:
+        """Matches an already processed query against the choices."""
+        if (results := self._results.get(query)) is not None:
+            return results
+
+        if len(self._results) >= MAX_MEMOIZED_QUERIES:
+            self._results.pop(next(iter(self._results)))
+
+        results: list[T] = []
+        if self.items:
+            best_scores = np.zeros(len(self.items), dtype=np.float64)
+            _score_choices(query, self._processed, DEFAULT_SCORERS, best_scores)
+            results = [self.items[i] for i in _best_matches(best_scores, 0.6, 5)]
+
+        self._results[query] = results
+        return results
+
+
+# keys are the kind of choice, the guild ID, and then whatever else narrows
+# down the choices (like a channel or user ID)
+AUTOCOMPLETE_CACHE: caches.StatsTTLCache[tuple, AutocompleteChoices] = (
+    caches.StatsTTLCache("autocomplete", ttl=30, hard_limit=500)
+)
+# bumped on every invalidation, so a fetch that raced with one
+# doesn't store stale data
+_invalidations = 0
+
+
+async def get_choices(
+    key: tuple,
+    fetch: typing.Callable[[], typing.Awaitable[list[T]]],
+    processor: typing.Callable[[T], str],
+    *,
+    max_items: int | None = None,
+) -> AutocompleteChoices[T] | None:
+    """
+    Gets the cached choices for a key, fetching them if needed.
+
+    If max_items is given, fetch should return at most one more item than it,
+    so that it can be told whether there were too many.
+
+    Returns None if fetching them took too long.
+    """
+    if (choices := AUTOCOMPLETE_CACHE.get(key)) is not None:
+        return choices
+
+    invalidations = _invalidations
+    try:
+        items = await asyncio.wait_for(fetch(), timeout=AUTOCOMPLETE_FETCH_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+
+    if max_items is not None and len(items) > max_items:
+        choices = AutocompleteChoices(items[:max_items], processor, complete=False)
+    else:
+        choices = AutocompleteChoices(items, processor)
+
+    if invalidations == _invalidations:
+        AUTOCOMPLETE_CACHE[key] = choices
+    return choices
+
+
+def invalidate_autocomplete(
+    kind: str,
+    guild_id: ipy.Snowflake_Type,
+    scope_id: ipy.Snowflake_Type | None = None,
+) -> None:
+    """
+    Drops the cached choices of a kind for a guild, or only those for one
+    of its channels or users if a scope ID is given.
+    """
+    global _invalidations
+    _invalidations += 1
+
+    guild_id = int(guild_id)
+    scope_id = int(scope_id) if scope_id is not None else None
+
+    for key in tuple(AUTOCOMPLETE_CACHE.keys()):
+        if (
+            key[0] == kind
+            and key[1] == guild_id
+            and (scope_id is None or key[2] == scope_id)
+        ):
+            AUTOCOMPLETE_CACHE.discard(key)
+
+
+def invalidate_bullet_autocomplete(
+    guild_id: ipy.Snowflake_Type, channel_id: ipy.Snowflake_Type | None = None
+) -> None:
+    invalidate_autocomplete("bullets", guild_id, channel_id)
 
-    return combined_list
+
+def invalidate_gacha_autocomplete(
+    guild_id: ipy.Snowflake_Type, user_id: ipy.Snowflake_Type | None = None
+) -> None:
+    """
+    Drops the cached gacha item choices for a guild. If a user ID is given,
+    only the choices of the items that user has are dropped.
+    """
+    if user_id is None:
+        invalidate_autocomplete("gacha_items", guild_id)
+    invalidate_autocomplete("gacha_user_items", guild_id, user_id)
 
 
 def get_bullet_name(bullet: models.TruthBullet) -> str:
@@ -59,7 +243,7 @@ async def autocomplete_bullets(
     only_not_found: bool = False,
     **kwargs: typing.Any,  # noqa: ARG001
 ) -> None:
-    if not channel:
+    if not channel or not ctx.guild_id:
         return await ctx.send([])
 
     where: PrismaTruthBulletWhereInput = {"channel_id": int(channel)}
@@ -67,18 +251,35 @@ async def autocomplete_bullets(
     if only_not_found:
         where["found"] = False
 
-    channel_bullets = await models.TruthBullet.prisma().find_many(where=where)
+    choices = await get_choices(
+        ("bullets", int(ctx.guild_id), int(channel), only_not_found),
+        lambda: models.TruthBullet.prisma().find_many(
+            where=where, take=MAX_BULLET_CHOICES + 1
+        ),
+        get_bullet_name,
+        max_items=MAX_BULLET_CHOICES,
+    )
+    if not choices:
+        return await ctx.send([])
 
     if not trigger:
-        return await ctx.send([{"name": b.trigger, "value": b.trigger} for b in channel_bullets][:25])  # type: ignore
+        return await ctx.send([{"name": b.trigger, "value": b.trigger} for b in choices.items][:25])  # type: ignore
 
-    query: list[list[models.TruthBullet]] = extract_from_list(
-        argument=trigger.lower(),
-        list_of_items=channel_bullets,
-        processors=[get_bullet_name],
-        score_cutoff=0.6,
-    )
-    return await ctx.send([{"name": b[0].trigger, "value": b[0].trigger} for b in query][:25])  # type: ignore
+    if choices.complete:
+        query = choices.match(trigger.lower())
+    else:
+        # there's too many to go through here, so let the database do it
+        try:
+            query = await asyncio.wait_for(
+                models.TruthBullet.search(
+                    channel, trigger, only_not_found=only_not_found
+                ),
+                timeout=AUTOCOMPLETE_FETCH_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            return await ctx.send([])
+
+    return await ctx.send([{"name": b.trigger, "value": b.trigger} for b in query][:25])  # type: ignore
 
 
 def get_alias_name(alias: str) -> str:
@@ -102,9 +303,9 @@ async def autocomplete_aliases(
     if not alias:
         return await ctx.send([{"name": a, "value": a} for a in truth_bullet.aliases][:25])  # type: ignore
 
-    query: list[list[str]] = extract_from_list(
-        argument=trigger.lower(),
-        list_of_items=truth_bullet.aliases,
+    query = extract_from_list(
+        argument=alias.lower(),
+        list_of_items=sorted(truth_bullet.aliases),
         processors=[get_alias_name],
         score_cutoff=0.6,
     )
@@ -123,24 +324,21 @@ async def autocomplete_gacha_item(
     if not ctx.guild_id:
         return await ctx.send([])
 
-    gacha_items = await models.GachaItem.prisma().find_many(
-        where={"guild_id": ctx.guild_id}
+    choices = await get_choices(
+        ("gacha_items", int(ctx.guild_id)),
+        lambda: models.GachaItem.prisma().find_many(where={"guild_id": ctx.guild_id}),
+        get_gacha_item_name,
     )
-    if not gacha_items:
+    if not choices or not choices.items:
         return await ctx.send([])
 
     if not name:
         return await ctx.send(
-            [{"name": g.name, "value": g.name} for g in gacha_items][:25]
+            [{"name": g.name, "value": g.name} for g in choices.items][:25]
         )
 
-    query: list[list[models.GachaItem]] = extract_from_list(
-        argument=name.lower(),
-        list_of_items=gacha_items,
-        processors=[get_gacha_item_name],
-        score_cutoff=0.6,
-    )
-    return await ctx.send([{"name": g[0].name, "value": g[0].name} for g in query][:25])  # type: ignore
+    query = choices.match(name.lower())
+    return await ctx.send([{"name": g.name, "value": g.name} for g in query][:25])  # type: ignore
 
 
 async def autocomplete_gacha_user_item(
@@ -151,30 +349,29 @@ async def autocomplete_gacha_user_item(
     if not ctx.guild_id:
         return await ctx.send([])
 
-    gacha_items = await models.GachaItem.prisma().find_many(
-        where={
-            "guild_id": ctx.guild_id,
-            "players": {
-                "some": {
-                    "player": {
-                        "is": {"guild_id": ctx.guild_id, "user_id": ctx.author.id}
+    choices = await get_choices(
+        ("gacha_user_items", int(ctx.guild_id), int(ctx.author.id)),
+        lambda: models.GachaItem.prisma().find_many(
+            where={
+                "guild_id": ctx.guild_id,
+                "players": {
+                    "some": {
+                        "player": {
+                            "is": {"guild_id": ctx.guild_id, "user_id": ctx.author.id}
+                        }
                     }
-                }
-            },
-        }
+                },
+            }
+        ),
+        get_gacha_item_name,
     )
-    if not gacha_items:
+    if not choices or not choices.items:
         return await ctx.send([])
 
     if not name:
         return await ctx.send(
-            [{"name": g.name, "value": g.name} for g in gacha_items][:25]
+            [{"name": g.name, "value": g.name} for g in choices.items][:25]
         )
 
-    query: list[list[models.GachaItem]] = extract_from_list(
-        argument=name.lower(),
-        list_of_items=gacha_items,
-        processors=[get_gacha_item_name],
-        score_cutoff=0.6,
-    )
-    return await ctx.send([{"name": g[0].name, "value": g[0].name} for g in query][:25])  # type: ignore
+    query = choices.match(name.lower())
+    return await ctx.send([{"name": g.name, "value": g.name} for g in query][:25])  # type: ignore
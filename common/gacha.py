@@ -0,0 +1,247 @@
+"""
+Copyright 2021-2024 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import collections
+import itertools
+import math
+import random
+
+import interactions as ipy
+import typing_extensions as typing
+
+import common.caches as caches
+import common.help_tools as help_tools
+import common.models as models
+import common.utils as utils
+
+# how many items are shown on each page of a profile
+PROFILE_PAGE_SIZE: typing.Final[int] = 30
+
+# how likely an item of each rarity is to be rolled, relative to the others
+RARITY_WEIGHTS: typing.Final[dict[str, int]] = {
+    "COMMON": 50,
+    "UNCOMMON": 25,
+    "RARE": 15,
+    "SUPER_RARE": 7,
+    "LEGENDARY": 3,
+}
+
+
+# how many times to draw again after drawing an excluded item, before only
+# drawing from the items that aren't excluded
+MAX_REDRAWS: typing.Final[int] = 8
+
+
+class StaleGachaPoolError(Exception):
+    """Raised when a roll tries to take more of an item than is left."""
+
+
+def item_weight(item: models.GachaItem) -> int:
+    return RARITY_WEIGHTS.get(item.rarity, RARITY_WEIGHTS["COMMON"])
+
+
+class GachaPool:
+    """The items that can currently be rolled in a guild, weighted by their rarity."""
+
+    __slots__ = ("_cum_weights", "_items", "_remaining")
+
+    def __init__(self, items: typing.Iterable[models.GachaItem]) -> None:
+        self._items = [item for item in items if item.amount != 0]
+        self._cum_weights = list(itertools.accumulate(map(item_weight, self._items)))
+        # how many are left of each limited item - kept here rather than on the
+        # items, as they're shared by every roll happening in the guild
+        self._remaining = {
+            item.id: item.amount for item in self._items if item.amount != -1
+        }
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def remaining(self, item: models.GachaItem) -> int:
+        """How many of an item are left, or -1 if it's unlimited."""
+        return self._remaining.get(item.id, -1)
+
+    def draw(
+        self, exclude: typing.Collection[int] = frozenset()
+    ) -> models.GachaItem | None:
+        """Picks a random item, skipping over any whose ID is in exclude."""
+        if not self._items:
+            return None
+
+        # re-rolling is much cheaper than making a new table for what's left,
+        # unless almost everything is excluded
+        for _ in range(MAX_REDRAWS):
+            (item,) = random.choices(  # noqa: S311
+                self._items, cum_weights=self._cum_weights
+            )
+            if item.id not in exclude:
+                return item
+
+        items = [item for item in self._items if item.id not in exclude]
+        if not items:
+            return None
+        (item,) = random.choices(  # noqa: S311
+            items, weights=list(map(item_weight, items))
+        )
+        return item
+
+    def draw_many(
+        self,
+        count: int,
+        exclude: typing.Collection[int] = frozenset(),
+        *,
+        duplicates: bool = True,
+    ) -> list[models.GachaItem]:
+        """
+        Picks multiple random items, as if they were rolled one after another.
+
+        Limited items are never picked more times than they have remaining.
+        If duplicates are not allowed, an item is never picked twice.
+        Fewer items than asked for are returned if the pool runs out.
+        """
+        if count == 1:
+            return [item] if (item := self.draw(exclude)) else []
+
+        excluded = set(exclude)
+        taken: collections.Counter[int] = collections.Counter()
+        items: list[models.GachaItem] = []
+
+        for _ in range(count):
+            item = self.draw(excluded)
+            if item is None:
+                break
+
+            items.append(item)
+            taken[item.id] += 1
+
+            if not duplicates or taken[item.id] == self.remaining(item):
+                excluded.add(item.id)
+
+        return items
+
+    def mark_taken(self, items: typing.Iterable[models.GachaItem]) -> bool:
+        """
+        Lowers the remaining amounts of limited items that were rolled.
+
+        Returns:
+            Whether any of them ran out.
+        """
+        ran_out = False
+
+        for item in items:
+            if item.id not in self._remaining:
+                continue
+
+            self._remaining[item.id] -= 1
+            if self._remaining[item.id] <= 0:
+                ran_out = True
+
+        return ran_out
+
+
+class GachaPools:
+    """
+    An in-memory cache of every guild's gacha pool.
+
+    Guilds are loaded lazily on their first roll and should be invalidated
+    whenever one of their items is added, edited or removed.
+    """
+
+    def __init__(self) -> None:
+        self._pools: caches.LazyKeyedCache[int, GachaPool] = caches.LazyKeyedCache(
+            self._load
+        )
+
+    def __len__(self) -> int:
+        return len(self._pools)
+
+    @staticmethod
+    async def _load(guild_id: int) -> GachaPool:
+        return GachaPool(
+            await models.GachaItem.prisma().find_many(
+                where={"guild_id": guild_id, "amount": {"not": 0}}
+            )
+        )
+
+    async def get(self, guild_id: ipy.Snowflake_Type) -> GachaPool:
+        return await self._pools.get(int(guild_id))
+
+    def mark_taken(
+        self, guild_id: ipy.Snowflake_Type, items: typing.Iterable[models.GachaItem]
+    ) -> None:
+        """
+        Updates the remaining amounts of limited items once a roll has been saved,
+        invalidating the guild's pool if any have run out.
+        """
+        pool = self._pools.peek(int(guild_id))
+        if pool is not None and pool.mark_taken(items):
+            self.invalidate(guild_id)
+
+    def invalidate(self, guild_id: ipy.Snowflake_Type) -> None:
+        self._pools.invalidate(int(guild_id))
+
+
+async def send_profile(
+    ctx: utils.THIASlashContext,
+    player: models.GachaPlayer,
+    user_display_name: str,
+    names: models.Names,
+    *,
+    ephemeral: bool = False,
+) -> None:
+    """
+    Sends a player's currency and items, with each item shown once alongside
+    how many the player has. Items are fetched page by page as needed.
+    """
+    title = f"{user_display_name}'s Gacha Data"
+    header = (
+        f"Currency: {player.currency_amount}"
+        f" {names.currency_name(player.currency_amount)}\n\n**Items:**"
+    )
+
+    async def fetch_page(
+        after: tuple[str, int] | None,
+    ) -> tuple[str, tuple[str, int] | None]:
+        entries = await player.item_counts(after, take=PROFILE_PAGE_SIZE)
+
+        str_builder = [
+            f"**{entry.name}**{f' x{entry.count}' if entry.count > 1 else ''} -"
+            f" {models.short_desc(entry.description)}"
+            for entry in entries
+        ]
+        if after is None:
+            str_builder.insert(0, header)
+            if not entries:
+                str_builder.append("*No items.*")
+
+        next_after = (
+            (entries[-1].name, entries[-1].item_id)
+            if len(entries) == PROFILE_PAGE_SIZE
+            else None
+        )
+        return "\n".join(str_builder), next_after
+
+    item_count = await player.unique_item_count()
+
+    if item_count <= PROFILE_PAGE_SIZE:
+        content, _ = await fetch_page(None)
+        await ctx.send(
+            embed=utils.make_embed(content, title=title), ephemeral=ephemeral
+        )
+        return
+
+    pag = await help_tools.LazyPaginator.create(
+        ctx.bot,
+        fetch_page,
+        math.ceil(item_count / PROFILE_PAGE_SIZE),
+        timeout=120,
+        default_title=title,
+        default_color=utils.BOT_COLOR,
+    )
+    await pag.send(ctx, ephemeral=ephemeral)
@@ -9,8 +9,11 @@ file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 import asyncio
 import contextlib
+import functools
 import inspect
 import re
+import sys
+import types
 
 import attrs
 import discord_typings
@@ -21,6 +24,7 @@ from interactions.ext import paginators
 from interactions.ext import prefixed_commands as prefixed
 from interactions.models.discord.emoji import process_emoji
 
+import common.caches as caches
 import common.utils as utils
 
 # i use spaces, so...
@@ -249,9 +253,123 @@ class HelpPaginator(paginators.Paginator):
         return self._message
 
 
-@attrs.define(init=False)
+@ipy.utils.define(kw_only=False, auto_detect=True)
+class LazyPaginator(HelpPaginator):
+    """
+    A paginator that fetches its pages as they are needed, rather than all at once.
+
+    `fetch_page` is given the cursor returned with the previous page (or None
+    for the first page), and should return the content of the page along with
+    the cursor for the next page, or None if there are no more pages.
+    """
+
+    fetch_page: typing.Callable[
+        [typing.Any], typing.Awaitable[tuple[str, typing.Any]]
+    ] = attrs.field(default=None, kw_only=True)
+    """The coroutine to call to get a page."""
+    page_count: int = attrs.field(default=1, kw_only=True)
+    """How many pages there are expected to be."""
+    show_select_menu: bool = attrs.field(default=False)
+    """Should a select menu be shown for navigation. Requires every page to be fetched."""
+
+    _cursor: typing.Any = attrs.field(default=None, init=False, repr=False)
+
+    @classmethod
+    async def create(
+        cls,
+        client: "ipy.Client",
+        fetch_page: typing.Callable[
+            [typing.Any], typing.Awaitable[tuple[str, typing.Any]]
+        ],
+        page_count: int,
+        *,
+        timeout: int = 0,
+        default_title: str | None = None,
+        default_color: ipy.Color = ipy.BrandColors.BLURPLE,
+    ) -> typing.Self:
+        """
+        Create a lazy paginator, fetching the pages needed to show the first one.
+
+        Args:
+            client: A reference to the client
+            fetch_page: The coroutine to call to get a page
+            page_count: How many pages there are expected to be
+            timeout: A timeout to wait before closing the paginator
+            default_title: The title to use for the embeds
+            default_color: The color to use for the embeds
+
+        Returns:
+            A paginator system
+        """
+        paginator = cls(
+            client,
+            fetch_page=fetch_page,
+            page_count=max(page_count, 1),
+            timeout_interval=timeout,
+            show_callback_button=False,
+            default_title=default_title,
+            default_color=default_color,
+        )
+        await paginator.fetch_up_to(1)
+        return paginator
+
+    async def fetch_up_to(self, index: int) -> None:
+        # the page after the current one is always fetched, so that the
+        # next and last buttons know if there's anywhere to go
+        index = min(index, self.page_count - 1)
+
+        while len(self.pages) <= index:
+            content, self._cursor = await self.fetch_page(self._cursor)
+
+            embed = ipy.Embed(
+                title=self.default_title,
+                description=content,
+                color=self.default_color,
+            )
+            embed.set_author(name=f"Page {len(self.pages) + 1}/{self.page_count}")
+            self.pages.append(embed)  # type: ignore
+
+            if self._cursor is None:
+                self.page_count = len(self.pages)
+                break
+
+    async def _on_button(
+        self, ctx: ipy.ComponentContext, *args: typing.Any, **kwargs: typing.Any
+    ) -> typing.Optional[ipy.Message]:
+        if ctx.author.id == self.author_id:
+            match ctx.custom_id.split("|")[1]:
+                case "next":
+                    target = self.page_index + 2
+                case "last":
+                    target = self.page_count - 1
+                case _:
+                    target = 0
+
+            if target >= len(self.pages):
+                # going to the last page may need a lot of pages to be fetched
+                if target - len(self.pages) > 1:
+                    await ctx.defer(edit_origin=True)
+                await self.fetch_up_to(target)
+
+        return await super()._on_button(ctx, *args, **kwargs)
+
+
+# most overrides only use a few of the sets, so the rest can all share this one
+EMPTY_IDS: typing.Final[frozenset[int]] = frozenset()
+
+
+def _freeze_ids(ids: set[int]) -> frozenset[int]:
+    return frozenset(ids) if ids else EMPTY_IDS
+
+
+@attrs.frozen(init=False)
 class PermissionsResolver:
-    """An attempt to make a class that can handle slash command permissions."""
+    """
+    An attempt to make a class that can handle slash command permissions.
+
+    Resolvers can't be changed once made, so commands without any overrides
+    can all share the same one - see default_permissions_resolver.
+    """
 
     default_member_permissions: typing.Optional[ipy.Permissions] = attrs.field(
         default=None
@@ -259,59 +377,54 @@ class PermissionsResolver:
 
     disabled_for_all_roles: bool = attrs.field(default=False)
     disabled_for_all_channels: bool = attrs.field(default=False)
-    allowed_channels: set[int] = attrs.field(factory=set)
-    denied_channels: set[int] = attrs.field(factory=set)
-    allowed_roles: set[int] = attrs.field(factory=set)
-    denied_roles: set[int] = attrs.field(factory=set)
-    allowed_users: set[int] = attrs.field(factory=set)
-    denied_users: set[int] = attrs.field(factory=set)
+    allowed_channels: frozenset[int] = attrs.field(default=EMPTY_IDS)
+    denied_channels: frozenset[int] = attrs.field(default=EMPTY_IDS)
+    allowed_roles: frozenset[int] = attrs.field(default=EMPTY_IDS)
+    denied_roles: frozenset[int] = attrs.field(default=EMPTY_IDS)
+    allowed_users: frozenset[int] = attrs.field(default=EMPTY_IDS)
+    denied_users: frozenset[int] = attrs.field(default=EMPTY_IDS)
 
     def __init__(
         self,
         default_member_permissions: typing.Optional[ipy.Permissions],
         guild_id: int,
         permissions_data: list[discord_typings.ApplicationCommandPermissionsData],
-    ) -> None:
-        # set all of the defaults
-        self.__attrs_init__(default_member_permissions=default_member_permissions)  # type: ignore
-        self.update(guild_id, permissions_data)
-
-    def update(
-        self,
-        guild_id: int,
-        permissions_data: list[discord_typings.ApplicationCommandPermissionsData],
     ) -> None:
         all_channels = guild_id - 1  # const set by discord
 
+        disabled_for_all_roles = False
+        disabled_for_all_channels = False
+        # indexed by the type of permission, and then if it's allowed
+        overrides: dict[int, tuple[set[int], set[int]]] = {
+            1: (set(), set()),  # role
+            2: (set(), set()),  # user
+            3: (set(), set()),  # channel
+        }
+
         for permission in permissions_data:
             object_id = int(permission["id"])
 
             if object_id == guild_id:  # @everyone
-                self.disabled_for_all_roles = permission["permission"]
+                disabled_for_all_roles = permission["permission"]
                 continue
             if object_id == all_channels:
-                self.disabled_for_all_channels = permission["permission"]
+                disabled_for_all_channels = permission["permission"]
                 continue
 
-            match permission["type"]:
-                case 1:  # role
-                    (
-                        self.allowed_roles.add(object_id)
-                        if permission["permission"]
-                        else self.denied_roles.add(object_id)
-                    )
-                case 2:  # user
-                    (
-                        self.allowed_users.add(object_id)
-                        if permission["permission"]
-                        else self.denied_users.add(object_id)
-                    )
-                case 3:  # channel
-                    (
-                        self.allowed_channels.add(object_id)
-                        if permission["permission"]
-                        else self.denied_channels.add(object_id)
-                    )
+            if permission["type"] in overrides:
+                overrides[permission["type"]][permission["permission"]].add(object_id)
+
+        self.__attrs_init__(  # type: ignore
+            default_member_permissions=default_member_permissions,
+            disabled_for_all_roles=disabled_for_all_roles,
+            disabled_for_all_channels=disabled_for_all_channels,
+            allowed_channels=_freeze_ids(overrides[3][True]),
+            denied_channels=_freeze_ids(overrides[3][False]),
+            allowed_roles=_freeze_ids(overrides[1][True]),
+            denied_roles=_freeze_ids(overrides[1][False]),
+            allowed_users=_freeze_ids(overrides[2][True]),
+            denied_users=_freeze_ids(overrides[2][False]),
+        )
 
     def has_permission(
         self,
@@ -379,6 +492,24 @@ class PermissionsResolver:
         return self.has_permission(ctx.channel, ctx.author, permission)
 
 
+@functools.cache
+def default_permissions_resolver(
+    default_member_permissions: typing.Optional[ipy.Permissions],
+) -> PermissionsResolver:
+    """Gets the shared resolver for commands with no overrides in a guild."""
+    return PermissionsResolver(default_member_permissions, 0, [])
+
+
+def get_permissions_resolver(
+    guild_perms: dict[int, PermissionsResolver],
+    cmd: ipy.SlashCommand,
+    guild_id: int,
+) -> PermissionsResolver:
+    return guild_perms.get(
+        int(cmd.get_cmd_id(guild_id))
+    ) or default_permissions_resolver(cmd.default_member_permissions)
+
+
 class GuildApplicationCommandPermissionData(typing.TypedDict):
     id: discord_typings.Snowflake
     application_id: discord_typings.Snowflake
@@ -386,19 +517,25 @@ class GuildApplicationCommandPermissionData(typing.TypedDict):
     permissions: list[discord_typings.ApplicationCommandPermissionsData]
 
 
-async def process_bulk_slash_perms(bot: utils.THIABase, guild_id: int) -> None:
+async def process_bulk_slash_perms(
+    bot: utils.THIABase, guild_id: int
+) -> dict[int, PermissionsResolver]:
+    """
+    Fetches and caches the permission overrides of every command in a guild.
+    Commands without overrides are left out, and use the default resolver.
+    """
     perms: list[GuildApplicationCommandPermissionData] = (
         await bot.http.batch_get_application_command_permissions(  # type: ignore
             int(bot.app.id), guild_id
         )
     )
 
-    guild_perms = {}
+    guild_perms: dict[int, PermissionsResolver] = {}
     cmds = get_commands_for_scope_by_ids(bot, guild_id)
 
     for cmd_perm in perms:
         cmd = cmds.get(cmd_perm["id"])
-        if not cmd:
+        if not cmd or not cmd_perm["permissions"]:
             continue
 
         resolver = PermissionsResolver(
@@ -406,12 +543,45 @@ async def process_bulk_slash_perms(bot: utils.THIABase, guild_id: int) -> None:
         )
         guild_perms[int(cmd_perm["id"])] = resolver
 
-    for cmd in (c for i, c in cmds.items() if not guild_perms.get(i)):
-        guild_perms[int(cmd.get_cmd_id(guild_id))] = PermissionsResolver(
-            cmd.default_member_permissions, guild_id, []
-        )
-
     bot.slash_perms_cache[guild_id] = guild_perms
+    return guild_perms
+
+
+async def get_guild_slash_perms(
+    bot: utils.THIABase, guild_id: int
+) -> dict[int, PermissionsResolver]:
+    if (guild_perms := bot.slash_perms_cache.get(guild_id)) is not None:
+        return guild_perms
+    return await process_bulk_slash_perms(bot, guild_id)
+
+
+def slash_perms_memory(bot: utils.THIABase) -> int:
+    """
+    Roughly how many bytes the slash permissions cache takes up.
+    Shared objects, like default resolvers and empty sets, are only counted once.
+    """
+    seen: set[int] = set()
+
+    def sizeof(obj: typing.Any) -> int:
+        if id(obj) in seen:
+            return 0
+        seen.add(id(obj))
+        return sys.getsizeof(obj)
+
+    total = sizeof(bot.slash_perms_cache)
+    # values doesn't go through get, so this isn't counted as hits and doesn't
+    # reorder or expire entries while they're being iterated over
+    for guild_perms in bot.slash_perms_cache.values():
+        total += sizeof(guild_perms)
+        for resolver in guild_perms.values():
+            total += sizeof(resolver)
+            total += sum(
+                sizeof(value)
+                for value in attrs.astuple(resolver, recurse=False)
+                if isinstance(value, frozenset)
+            )
+
+    return total
 
 
 def _generate_signature(cmd: ipy.SlashCommand) -> str:
@@ -534,17 +704,27 @@ def get_commands_for_scope_by_ids(bot: utils.THIABase, guild_id: int) -> dict:
     }
 
 
+def _command_scope(bot: utils.THIABase, guild_id: int) -> int:
+    # guilds only need their own tree if they have commands of their own
+    return guild_id if bot.interactions_by_scope.get(guild_id) else 0
+
+
 def get_mini_commands_for_scope(
     bot: utils.THIABase, guild_id: int
-) -> dict[str, MiniCommand]:
-    if (
-        mini_cmds := bot.mini_commands_per_scope.get(guild_id, ipy.MISSING)
-    ) is not ipy.MISSING:
-        return mini_cmds  # type: ignore
+) -> typing.Mapping[str, MiniCommand]:
+    """
+    Gets the command tree for a guild.
 
-    scope_cmds = bot.interactions_by_scope.get(
-        ipy.const.GLOBAL_SCOPE, {}
-    ) | bot.interactions_by_scope.get(guild_id, {})
+    The tree is shared by every guild in the same command scope, so it must
+    not be modified.
+    """
+    scope = _command_scope(bot, guild_id)
+    if (mini_cmds := bot.mini_commands_per_scope.get(scope)) is not None:
+        return mini_cmds
+
+    scope_cmds = bot.interactions_by_scope.get(ipy.const.GLOBAL_SCOPE, {})
+    if scope:
+        scope_cmds = scope_cmds | bot.interactions_by_scope[scope]
     commands = [v for v in scope_cmds.values() if isinstance(v, ipy.SlashCommand)]
 
     top_level = {c for c in commands if not c.is_subcommand}
@@ -583,8 +763,19 @@ def get_mini_commands_for_scope(
         group_mini_cmd.add_subcommand(mini_cmd)
         commands_dict[cmd.resolved_name] = mini_cmd
 
-    bot.mini_commands_per_scope[guild_id] = commands_dict
-    return commands_dict
+    mini_cmds = types.MappingProxyType(commands_dict)
+    bot.mini_commands_per_scope[scope] = mini_cmds
+    return mini_cmds
+
+
+def rebuild_mini_commands(bot: utils.THIABase) -> None:
+    """
+    Drops every command tree and builds the global one again.
+    Should be called whenever commands are added or removed.
+    """
+    bot.mini_commands_per_scope.clear()
+    invalidate_can_run()
+    get_mini_commands_for_scope(bot, 0)
 
 
 async def _check_wrapper(ctx: ipy.BaseContext, check: typing.Callable) -> bool:
@@ -595,6 +786,23 @@ async def _check_wrapper(ctx: ipy.BaseContext, check: typing.Callable) -> bool:
         return False
 
 
+# keys are the guild, user, channel, user's roles, and command name
+CAN_RUN_CACHE: caches.StatsTTLCache[tuple[int, int, int, frozenset[int], str], bool] = (
+    caches.StatsTTLCache("can_run", ttl=30, hard_limit=5000)
+)
+
+
+def invalidate_can_run(guild_id: int | None = None) -> None:
+    """Forgets if commands can be run in a guild, or in every guild if none is given."""
+    if guild_id is None:
+        CAN_RUN_CACHE.clear()
+        return
+
+    for key in tuple(CAN_RUN_CACHE.keys()):
+        if key[0] == guild_id:
+            CAN_RUN_CACHE.discard(key)
+
+
 async def can_run(
     ctx: (
         ipy.BaseInteractionContext[utils.THIABase]
@@ -604,19 +812,49 @@ async def can_run(
 ) -> bool:
     """
     Determines if this command can be run, but ignores cooldowns and concurrency.
+
+    Results are remembered for a short while for each user, channel and set
+    of roles, as checks can be costly and the help command checks every command.
     """
+    guild_id = int(ctx.guild_id)
+    key = (
+        guild_id,
+        int(ctx.author.id),
+        int(ctx.channel_id),
+        frozenset(ctx.author._role_ids),
+        cmd.resolved_name,
+    )
+
+    if (result := CAN_RUN_CACHE.get(key)) is not None:
+        return result
+
+    result = await _can_run(ctx, cmd)
+
+    # if the guild's permissions aren't loaded, the result isn't worth keeping
+    if ctx.bot.slash_perms_cache.peek(guild_id) is not None:
+        CAN_RUN_CACHE[key] = result
+
+    return result
+
 
+async def _can_run(
+    ctx: (
+        ipy.BaseInteractionContext[utils.THIABase]
+        | hybrid.HybridContext[utils.THIABase]
+    ),
+    cmd: MiniCommand,
+) -> bool:
     slash_cmd = cmd.slash_command
 
     if not slash_cmd.get_cmd_id(int(ctx.guild_id)):
         return False
 
-    if not ctx.bot.slash_perms_cache.get(int(ctx.guild_id)):
+    if (guild_perms := ctx.bot.slash_perms_cache.get(int(ctx.guild_id))) is None:
         return False
 
-    if not ctx.bot.slash_perms_cache[int(ctx.guild_id)][
-        int(slash_cmd.get_cmd_id(int(ctx.guild_id)))
-    ].has_permission_ctx(ctx):
+    if not get_permissions_resolver(
+        guild_perms, slash_cmd, int(ctx.guild_id)
+    ).has_permission_ctx(ctx):
         return False
 
     if cmd.subcommands:
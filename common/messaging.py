@@ -0,0 +1,403 @@
+"""
+Copyright 2021-2024 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import asyncio
+import collections
+import contextlib
+import datetime
+import logging
+import random
+from enum import IntEnum
+
+import interactions as ipy
+import typing_extensions as typing
+
+import common.caches as caches
+import common.models as models
+import common.utils as utils
+
+if typing.TYPE_CHECKING:
+    from prisma.types import PrismaQueuedMessageWhereInput
+
+logger = logging.getLogger("uibot")
+
+# how many relayed messages can be sent at once in a guild
+GUILD_SEND_CONCURRENCY: typing.Final[int] = 5
+
+# how many queued messages are sent at a time
+OUTBOX_BATCH_SIZE: typing.Final[int] = 50
+# how often to check for queued messages when nothing's been queued
+OUTBOX_POLL_INTERVAL: typing.Final[float] = 30.0
+# how long to wait before the first retry, doubling each time after
+OUTBOX_BASE_BACKOFF: typing.Final[float] = 5.0
+OUTBOX_MAX_BACKOFF: typing.Final[float] = 600.0
+# how many times to try sending a message before giving up on it
+OUTBOX_MAX_ATTEMPTS: typing.Final[int] = 8
+# how long a claimed batch is kept from other workers, in seconds, in case
+# whoever claimed it stops before it's done
+OUTBOX_CLAIM_TIMEOUT: typing.Final[int] = 300
+
+
+class MessageLinks:
+    """
+    An in-memory map of every guild's messaging links, from user to channel.
+
+    Guilds are loaded lazily on their first message and should be updated
+    whenever one of their links is added, changed or removed.
+    """
+
+    def __init__(self) -> None:
+        self._links: caches.LazyKeyedCache[int, dict[int, int]] = caches.LazyKeyedCache(
+            self._load
+        )
+
+    def __len__(self) -> int:
+        return len(self._links)
+
+    @staticmethod
+    async def _load(guild_id: int) -> dict[int, int]:
+        return {
+            link.user_id: link.channel_id
+            for link in await models.MessageLink.prisma().find_many(
+                where={"guild_id": guild_id}
+            )
+        }
+
+    async def get(self, guild_id: ipy.Snowflake_Type) -> dict[int, int]:
+        return await self._links.get(int(guild_id))
+
+    async def resolve(
+        self,
+        guild_id: ipy.Snowflake_Type,
+        sender_id: ipy.Snowflake_Type,
+        recipient_id: ipy.Snowflake_Type,
+    ) -> tuple[int | None, int | None]:
+        """Gets the channels linked to the sender and the recipient of a message."""
+        links = await self.get(guild_id)
+        return links.get(int(sender_id)), links.get(int(recipient_id))
+
+    def set_link(
+        self,
+        guild_id: ipy.Snowflake_Type,
+        user_id: ipy.Snowflake_Type,
+        channel_id: ipy.Snowflake_Type,
+    ) -> None:
+        if (links := self._links.peek(int(guild_id))) is not None:
+            links[int(user_id)] = int(channel_id)
+        else:
+            # makes sure a load that's happening right now doesn't miss this
+            self.invalidate(guild_id)
+
+    def remove_link(
+        self, guild_id: ipy.Snowflake_Type, user_id: ipy.Snowflake_Type
+    ) -> None:
+        if (links := self._links.peek(int(guild_id))) is not None:
+            links.pop(int(user_id), None)
+        else:
+            self.invalidate(guild_id)
+
+    def invalidate(self, guild_id: ipy.Snowflake_Type) -> None:
+        self._links.invalidate(int(guild_id))
+
+
+class MessageRelay:
+    """
+    Sends relayed messages, a limited amount at a time for each guild.
+
+    This smooths out bursts of messages from one guild instead of having them
+    all fight over rate limits at once.
+    """
+
+    def __init__(self) -> None:
+        self._semaphores: dict[int, asyncio.Semaphore] = {}
+        self._pending: collections.Counter[int] = collections.Counter()
+
+    def __len__(self) -> int:
+        return len(self._semaphores)
+
+    async def send(
+        self,
+        guild_id: ipy.Snowflake_Type,
+        channel: ipy.GuildText,
+        embed: ipy.Embed,
+        *,
+        nonce: str | None = None,
+    ) -> ipy.Message:
+        """
+        Sends a message, waiting for its turn if the guild is busy.
+
+        If a nonce is given, Discord makes sure the message is only sent once,
+        even if this is called again with the same nonce.
+        """
+        guild_id = int(guild_id)
+
+        self._pending[guild_id] += 1
+        semaphore = self._semaphores.setdefault(
+            guild_id, asyncio.Semaphore(GUILD_SEND_CONCURRENCY)
+        )
+
+        try:
+            async with semaphore:
+                return await channel.send(
+                    embed=embed, nonce=nonce, enforce_nonce=nonce is not None
+                )
+        finally:
+            self._pending[guild_id] -= 1
+            if not self._pending[guild_id]:
+                del self._pending[guild_id]
+                self._semaphores.pop(guild_id, None)
+
+
+class OutgoingMessage(typing.NamedTuple):
+    # at most 24 characters, as the key of the receipt adds one to it
+    idempotency_key: str
+    channel_id: int
+    title: str
+    description: str
+    # where to send the receipt or say that the message couldn't be sent
+    sender_channel_id: int | None = None
+    # the receipt is only sent once the message itself has been
+    receipt_title: str | None = None
+
+
+class SendResult(IntEnum):
+    SENT = 1
+    FAILED = 2
+    RETRY = 3
+    # a message before it in the same channel is being retried
+    BLOCKED = 4
+
+
+class MessageOutbox:
+    """
+    Sends relayed messages that were queued in the database, retrying them
+    with exponential backoff if Discord is having issues.
+
+    Messages to the same channel are sent in order, one after another.
+    """
+
+    def __init__(self, bot: utils.THIABase) -> None:
+        self.bot = bot
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = self.bot.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def enqueue(
+        self, guild_id: ipy.Snowflake_Type, *messages: OutgoingMessage
+    ) -> None:
+        """
+        Queues messages to be sent as soon as possible.
+        Messages whose idempotency key was already queued are ignored.
+        """
+        await models.QueuedMessage.prisma().create_many(
+            data=[
+                {
+                    "idempotency_key": message.idempotency_key,
+                    "guild_id": int(guild_id),
+                    "channel_id": message.channel_id,
+                    "title": message.title,
+                    "description": message.description,
+                    "sender_channel_id": message.sender_channel_id,
+                    "receipt_title": message.receipt_title,
+                }
+                for message in messages
+            ],
+            skip_duplicates=True,
+        )
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        await self.bot.wait_until_ready()
+
+        while True:
+            self._wakeup.clear()
+
+            try:
+                delay = await self.drain()
+            except Exception:
+                logger.exception("Failed to send queued messages.")
+                delay = OUTBOX_POLL_INTERVAL
+
+            if delay > 0:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+
+    async def drain(self) -> float:
+        """
+        Sends one batch of messages that are due.
+
+        Returns:
+            How long to wait before the next batch.
+        """
+        entries = await models.QueuedMessage.claim_due(
+            OUTBOX_BATCH_SIZE, OUTBOX_CLAIM_TIMEOUT
+        )
+        if not entries:
+            return await self._next_delay()
+
+        by_channel: collections.defaultdict[int, list[models.QueuedMessage]] = (
+            collections.defaultdict(list)
+        )
+        for entry in entries:
+            by_channel[entry.channel_id].append(entry)
+
+        results: dict[int, SendResult] = {}
+        await asyncio.gather(
+            *(self._send_channel(batch, results) for batch in by_channel.values())
+        )
+
+        # every claimed message gets the same lock, which is what tells this
+        # claim apart from a later one if the lock ran out mid-send
+        claim = entries[0].locked_until
+
+        done_ids = [
+            entry_id
+            for entry_id, result in results.items()
+            if result in {SendResult.SENT, SendResult.FAILED}
+        ]
+        blocked_ids = [
+            entry_id
+            for entry_id, result in results.items()
+            if result == SendResult.BLOCKED
+        ]
+        receipts = [
+            {
+                "idempotency_key": f"{entry.idempotency_key}r",
+                "guild_id": entry.guild_id,
+                "channel_id": entry.sender_channel_id,
+                "title": entry.receipt_title,
+                "description": entry.description,
+            }
+            for entry in entries
+            if results[entry.id] == SendResult.SENT
+            and entry.sender_channel_id
+            and entry.receipt_title
+        ]
+
+        if done_ids:
+            # the receipts have to be queued no matter what once their messages
+            # are gone from the queue
+            async with self.bot.db.tx() as tx:
+                if receipts:
+                    await models.QueuedMessage.prisma(tx).create_many(
+                        data=receipts, skip_duplicates=True
+                    )
+                await models.QueuedMessage.prisma(tx).delete_many(
+                    where={"id": {"in": done_ids}, "locked_until": claim}
+                )
+
+            if receipts:
+                self._wakeup.set()
+
+        if blocked_ids:
+            await models.QueuedMessage.prisma().update_many(
+                where={"id": {"in": blocked_ids}, "locked_until": claim},
+                data={"locked_until": None},
+            )
+
+        for entry in entries:
+            if results[entry.id] == SendResult.RETRY:
+                await self._schedule_retry(entry)
+
+        if len(entries) == OUTBOX_BATCH_SIZE:
+            return 0
+        return await self._next_delay()
+
+    async def _next_delay(self) -> float:
+        next_entry = await models.QueuedMessage.prisma().find_first(
+            where={"next_attempt_at": {"gt": ipy.Timestamp.utcnow()}},
+            order={"next_attempt_at": "asc"},
+        )
+        if not next_entry:
+            return OUTBOX_POLL_INTERVAL
+
+        delay = (next_entry.next_attempt_at - ipy.Timestamp.utcnow()).total_seconds()
+        return min(max(delay, 0), OUTBOX_POLL_INTERVAL)
+
+    async def _send_channel(
+        self,
+        entries: list[models.QueuedMessage],
+        results: dict[int, SendResult],
+    ) -> None:
+        for index, entry in enumerate(entries):
+            result = await self._send(entry)
+            results[entry.id] = result
+
+            if result == SendResult.RETRY:
+                # the rest wait for this one to be retried so that they stay in
+                # order, which claim_due takes care of from here on
+                for later_entry in entries[index + 1 :]:
+                    results[later_entry.id] = SendResult.BLOCKED
+                return
+
+    async def _send(self, entry: models.QueuedMessage) -> SendResult:
+        try:
+            await self.bot.message_relay.send(
+                entry.guild_id,
+                utils.partial_channel(self.bot, entry.channel_id),
+                utils.make_embed(entry.description, title=entry.title),
+                nonce=entry.idempotency_key,
+            )
+        except ipy.errors.HTTPException as e:
+            if e.status != 429 and e.status < 500:
+                # retrying isn't going to make this work
+                await self._report_failure(entry)
+                return SendResult.FAILED
+            return SendResult.RETRY
+        except Exception:
+            logger.warning("Failed to send queued message %s.", entry.id, exc_info=True)
+            return SendResult.RETRY
+
+        return SendResult.SENT
+
+    async def _schedule_retry(self, entry: models.QueuedMessage) -> None:
+        claimed: PrismaQueuedMessageWhereInput = {
+            "id": entry.id,
+            "locked_until": entry.locked_until,
+        }
+
+        if entry.attempts + 1 >= OUTBOX_MAX_ATTEMPTS:
+            logger.warning("Gave up on sending queued message %s.", entry.id)
+            if await models.QueuedMessage.prisma().delete_many(where=claimed):
+                await self._report_failure(entry)
+            return
+
+        backoff = min(OUTBOX_BASE_BACKOFF * 2**entry.attempts, OUTBOX_MAX_BACKOFF)
+        # jitter, so that everything that failed at once doesn't retry at once
+        backoff *= random.uniform(0.5, 1)  # noqa: S311
+
+        await models.QueuedMessage.prisma().update_many(
+            where=claimed,
+            data={
+                "attempts": {"increment": 1},
+                "next_attempt_at": ipy.Timestamp.utcnow()
+                + datetime.timedelta(seconds=backoff),
+                "locked_until": None,
+            },
+        )
+
+    async def _report_failure(self, entry: models.QueuedMessage) -> None:
+        if not entry.sender_channel_id:
+            return
+
+        with contextlib.suppress(ipy.errors.HTTPException):
+            await utils.partial_channel(self.bot, entry.sender_channel_id).send(
+                embed=utils.error_embed_generate(
+                    "A message you sent could not be"
+                    f" delivered:\n\n{models.short_desc(entry.description, 4000)}"
+                )
+            )
@@ -7,7 +7,9 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
+import collections
 import contextlib
+import copy
 import datetime
 import os
 import re
@@ -29,13 +31,16 @@ from prisma.models import (
     PrismaMessageConfig,
     PrismaMessageLink,
     PrismaNames,
+    PrismaQueuedMessage,
     PrismaTruthBullet,
 )
 from prisma.types import (
     PrismaGachaPlayerInclude,
     PrismaGuildConfigInclude,
 )
-from pydantic import field_serializer, field_validator
+from pydantic import BaseModel, PrivateAttr, field_serializer, field_validator
+
+import common.caches as caches
 
 
 # yes, this is a copy from common.utils
@@ -44,17 +49,6 @@ def yesno_friendly_str(bool_to_convert: bool) -> str:
     return "yes" if bool_to_convert else "no"
 
 
-def generate_regexp(attribute: str) -> str:
-    return rf"regexp_replace({attribute}, '([\%_])', '\\\1', 'g')"
-
-
-ILIKE_ESCAPE = re.compile(r"([\%_])")
-
-
-def escape_ilike(value: str) -> str:
-    return ILIKE_ESCAPE.sub(r"\\\1", value)
-
-
 TEMPLATE_MARKDOWN = re.compile(r"({{(.*)}})")
 
 
@@ -68,7 +62,51 @@ def short_desc(description: str, length: int = 25) -> str:
     return description
 
 
-class TruthBullet(PrismaTruthBullet):
+class ChangeTrackingMixin(BaseModel):
+    """
+    A mixin for models that remembers what their fields were when loaded or
+    last saved, so that saves only need to send what actually changed.
+    """
+
+    _snapshot: dict[str, typing.Any] = PrivateAttr(default_factory=dict)
+
+    # relations and the like, which are never written back by save()
+    untracked_fields: typing.ClassVar[frozenset[str]] = frozenset()
+
+    def model_post_init(self, __context: typing.Any) -> None:
+        super().model_post_init(__context)
+        self.mark_clean()
+
+    def mark_clean(self, *fields: str) -> None:
+        """Marks the fields given, or all fields if none are given, as unchanged."""
+        if not fields:
+            self._snapshot = {}
+            fields = tuple(
+                field
+                for field in self.model_fields
+                if field not in self.untracked_fields
+            )
+
+        for field in fields:
+            if field not in self.untracked_fields:
+                # copied so that in-place changes, like to sets, are caught
+                self._snapshot[field] = copy.copy(getattr(self, field))
+
+    def changed_fields(self) -> set[str]:
+        return {
+            field
+            for field, value in self._snapshot.items()
+            if getattr(self, field) != value
+        }
+
+    def changed_data(self) -> dict[str, typing.Any]:
+        """Dumps only the fields that have changed since the last save."""
+        if changed := self.changed_fields():
+            return self.model_dump(include=changed)
+        return {}
+
+
+class TruthBullet(ChangeTrackingMixin, PrismaTruthBullet):
     aliases: set[str]
 
     @field_validator("aliases", mode="after")
@@ -118,32 +156,110 @@ class TruthBullet(PrismaTruthBullet):
         return embed
 
     @classmethod
-    async def find(
+    async def find_exact(
         cls, channel_id: ipy.Snowflake_Type, content: str
     ) -> typing.Self | None:
         return await cls.prisma().query_first(
-            FIND_TRUTH_BULLET_STR, int(channel_id), content
+            FIND_TRUTH_BULLET_EXACT_STR, int(channel_id), content
         )
 
     @classmethod
-    async def find_exact(
-        cls, channel_id: ipy.Snowflake_Type, content: str
+    async def find_possible_bullet(
+        cls, channel_id: ipy.Snowflake_Type, trigger: str
     ) -> typing.Self | None:
         return await cls.prisma().query_first(
-            FIND_TRUTH_BULLET_EXACT_STR, int(channel_id), content
+            FIND_TRUTH_BULLET_BY_TRIGGER_STR, int(channel_id), trigger
         )
 
     @classmethod
-    async def find_possible_bullet(
+    async def search(
+        cls,
+        channel_id: ipy.Snowflake_Type,
+        query: str,
+        *,
+        only_not_found: bool = False,
+        limit: int = 25,
+    ) -> list[typing.Self]:
+        """
+        Finds the Truth Bullets in a channel whose triggers are most similar
+        to the query, using trigram similarity.
+
+        Triggers starting with the query are always included and come first.
+        """
+        return await cls.prisma().query_raw(
+            SEARCH_TRUTH_BULLETS_STR,
+            int(channel_id),
+            query.lower(),
+            only_not_found,
+            limit,
+        )
+
+    @classmethod
+    async def delete_by_trigger(
         cls, channel_id: ipy.Snowflake_Type, trigger: str
-    ) -> typing.Self | None:
-        return await cls.prisma().find_first(
-            where={
-                "channel_id": int(channel_id),
-                "trigger": {"equals": escape_ilike(trigger), "mode": "insensitive"},
-            }
+    ) -> int:
+        return await cls.prisma()._client.execute_raw(
+            DELETE_TRUTH_BULLET_BY_TRIGGER_STR, int(channel_id), trigger
         )
 
+    @classmethod
+    async def unfound_channel_ids(
+        cls, guild_id: ipy.Snowflake_Type | None = None
+    ) -> list[int]:
+        """Gets every channel with unfound Truth Bullets, optionally in one guild."""
+        rows: list[dict[str, typing.Any]] = await cls.prisma()._client.query_raw(
+            UNFOUND_CHANNEL_IDS_STR, int(guild_id) if guild_id else None
+        )
+        return [int(row["channel_id"]) for row in rows]
+
+    @classmethod
+    async def channel_has_unfound(cls, channel_id: ipy.Snowflake_Type) -> bool:
+        return (
+            await cls.prisma().count(
+                where={"channel_id": int(channel_id), "found": False}
+            )
+            > 0
+        )
+
+    @classmethod
+    async def finder_tally(
+        cls, guild_id: ipy.Snowflake_Type
+    ) -> tuple[int, collections.Counter[int]]:
+        """
+        Gets how many Truth Bullets are left to be found in a guild, along with
+        how many each person has found, in one query.
+        """
+        rows: list[dict[str, typing.Any]] = await cls.prisma()._client.query_raw(
+            FINDER_TALLY_STR, int(guild_id)
+        )
+
+        remaining = 0
+        counter: collections.Counter[int] = collections.Counter()
+
+        for row in rows:
+            remaining += int(row["unfound_count"])
+            if row["finder"] is not None and row["found_count"]:
+                counter[int(row["finder"])] = int(row["found_count"])
+
+        return remaining, counter
+
+    @classmethod
+    async def names_by_channel(
+        cls, channel_ids: typing.Iterable[ipy.Snowflake_Type]
+    ) -> collections.defaultdict[int, set[str]]:
+        """
+        Gets the lowercased triggers and aliases of every Truth Bullet in the
+        channels, in one query.
+        """
+        rows: list[dict[str, typing.Any]] = await cls.prisma()._client.query_raw(
+            BULLET_NAMES_BY_CHANNEL_STR, [int(channel_id) for channel_id in channel_ids]
+        )
+
+        names: collections.defaultdict[int, set[str]] = collections.defaultdict(set)
+        for row in rows:
+            names[int(row["channel_id"])].update(row["names"])
+        return names
+
     @classmethod
     async def validate(cls, channel_id: ipy.Snowflake_Type, trigger: str) -> bool:
         return (
@@ -153,9 +269,70 @@ class TruthBullet(PrismaTruthBullet):
             is not None
         )
 
+    @classmethod
+    async def claim_first(
+        cls, bullet_ids: list[int], finder_id: ipy.Snowflake_Type
+    ) -> typing.Self | None:
+        """
+        Marks the first unfound Truth Bullet out of the IDs given as found by
+        someone, in one atomic update.
+
+        Returns:
+            The claimed Truth Bullet, or None if all of them have been found already.
+        """
+        return await cls.prisma().query_first(
+            CLAIM_TRUTH_BULLET_STR, int(finder_id), bullet_ids
+        )
+
+    @classmethod
+    async def claim_by_trigger(
+        cls,
+        channel_id: ipy.Snowflake_Type,
+        trigger: str,
+        finder_id: ipy.Snowflake_Type,
+    ) -> typing.Self | None:
+        """
+        Marks the unfound Truth Bullet with the trigger or alias given as found
+        by someone, in one atomic update.
+
+        Returns:
+            The claimed Truth Bullet, or None if it does not exist or was found already.
+        """
+        return await cls.prisma().query_first(
+            CLAIM_TRUTH_BULLET_EXACT_STR, int(finder_id), int(channel_id), trigger
+        )
+
+    @classmethod
+    async def override_finder(
+        cls,
+        channel_id: ipy.Snowflake_Type,
+        trigger: str,
+        finder_id: ipy.Snowflake_Type,
+    ) -> bool:
+        return (
+            await cls.prisma()._client.execute_raw(
+                OVERRIDE_TRUTH_BULLET_FINDER_STR,
+                int(finder_id),
+                int(channel_id),
+                trigger,
+            )
+            > 0
+        )
+
+    async def unclaim(self) -> None:
+        self.found = False
+        self.finder = None
+        await self.prisma().update(
+            where={"id": self.id}, data={"found": False, "finder": None}
+        )
+        self.mark_clean("found", "finder")
+
     async def save(self) -> None:
-        data = self.model_dump()
+        if not (data := self.changed_data()):
+            return
+
         await self.prisma().update(where={"id": self.id}, data=data)  # type: ignore
+        self.mark_clean()
 
 
 class GetMethodsMixin:
@@ -174,15 +351,44 @@ class GetMethodsMixin:
         )
 
 
-class Names(GetMethodsMixin, PrismaNames):
+# full guild configs, along with whatever sub-configs have been loaded for them
+GUILD_CONFIG_CACHE: "caches.StatsTTLCache[int, GuildConfig]" = caches.StatsTTLCache(
+    "guild_config", ttl=300, hard_limit=1000
+)
+
+
+def _update_cached_config(guild_id: int, field: str, value: typing.Any) -> None:
+    if config := GUILD_CONFIG_CACHE.peek(int(guild_id)):
+        if isinstance(value, BaseModel):
+            value = value.model_copy(deep=True)
+        setattr(config, field, value)
+        config.mark_clean(field)
+
+
+def invalidate_guild_config(guild_id: ipy.Snowflake_Type) -> None:
+    """
+    Removes a guild's config from the cache.
+
+    Should be used whenever a config is changed without going through its `save`.
+    """
+    GUILD_CONFIG_CACHE.discard(int(guild_id))
+
+
+class Names(GetMethodsMixin, ChangeTrackingMixin, PrismaNames):
     main_config: "typing.Optional[GuildConfig]" = None
 
+    untracked_fields = frozenset({"main_config"})
+
     def currency_name(self, amount: int) -> str:
         return self.singular_currency_name if amount == 1 else self.plural_currency_name
 
     async def save(self) -> None:
-        data = self.model_dump(exclude={"main_config"})
+        if not (data := self.changed_data()):
+            return
+
         await self.prisma().update(where={"guild_id": self.guild_id}, data=data)  # type: ignore
+        self.mark_clean()
+        _update_cached_config(self.guild_id, "names", self)
 
 
 class InvestigationType(IntEnum):
@@ -190,10 +396,12 @@ class InvestigationType(IntEnum):
     COMMAND_ONLY = 2
 
 
-class BulletConfig(GetMethodsMixin, PrismaBulletConfig):
+class BulletConfig(GetMethodsMixin, ChangeTrackingMixin, PrismaBulletConfig):
     investigation_type: InvestigationType
     main_config: "typing.Optional[GuildConfig]" = None
 
+    untracked_fields = frozenset({"main_config"})
+
     @field_validator("investigation_type", mode="after")
     @classmethod
     def _transform_int_into_investigation_type(cls, value: int) -> InvestigationType:
@@ -204,23 +412,34 @@ class BulletConfig(GetMethodsMixin, PrismaBulletConfig):
         return value.value
 
     async def save(self) -> None:
-        data = self.model_dump(exclude={"main_config"})
+        if not (data := self.changed_data()):
+            return
+
         await self.prisma().update(where={"guild_id": self.guild_id}, data=data)  # type: ignore
+        self.mark_clean()
+        _update_cached_config(self.guild_id, "bullets", self)
 
 
-class ItemToPlayer(PrismaItemToPlayer):
+class ItemToPlayer(ChangeTrackingMixin, PrismaItemToPlayer):
     item: typing.Optional["GachaItem"] = None
     player: typing.Optional["GachaPlayer"] = None
 
+    untracked_fields = frozenset({"item", "player"})
+
     async def save(self) -> None:
-        data = self.model_dump(exclude={"item", "player"})
+        if not (data := self.changed_data()):
+            return
+
         await self.prisma().update(where={"id": self.id}, data=data)
+        self.mark_clean()
 
 
-class GachaItem(PrismaGachaItem):
+class GachaItem(ChangeTrackingMixin, PrismaGachaItem):
     players: "typing.Optional[list[ItemToPlayer]]" = None
     gacha_config: "typing.Optional[GachaConfig]" = None
 
+    untracked_fields = frozenset({"players", "gacha_config"})
+
     def embed(self, *, show_amount: bool = False) -> ipy.Embed:
         embed = ipy.Embed(
             title=self.name,
@@ -241,14 +460,26 @@ class GachaItem(PrismaGachaItem):
         return embed
 
     async def save(self) -> None:
-        data = self.model_dump(exclude={"gacha_config", "players"})
+        if not (data := self.changed_data()):
+            return
+
         await self.prisma().update(where={"id": self.id}, data=data)  # type: ignore
+        self.mark_clean()
+
+
+class PlayerItemCount(typing.NamedTuple):
+    item_id: int
+    name: str
+    description: str  # only the start of it, enough for short_desc
+    count: int
 
 
-class GachaPlayer(PrismaGachaPlayer):
+class GachaPlayer(ChangeTrackingMixin, PrismaGachaPlayer):
     items: "typing.Optional[list[ItemToPlayer]]" = None
     gacha_config: "typing.Optional[GachaConfig]" = None
 
+    untracked_fields = frozenset({"items", "gacha_config", "id", "guild_id"})
+
     @classmethod
     async def get(
         cls,
@@ -284,70 +515,241 @@ class GachaPlayer(PrismaGachaPlayer):
             data={"guild_id": guild_id, "user_id": user_id}, include=include
         )
 
-    def create_profile(self, user_display_name: str, names: "Names") -> list[ipy.Embed]:
-        str_builder = [
-            (
-                "Currency:"
-                f" {self.currency_amount} {names.currency_name(self.currency_amount)}"
-            ),
-            "\n**Items:**",
-        ]
+    @classmethod
+    async def currency_page(
+        cls, guild_id: int, after_id: int | None = None, take: int = 25
+    ) -> list[typing.Self]:
+        """
+        Gets a page of a guild's players, ordered by most currency first.
+
+        Args:
+            guild_id: The ID of the guild.
+            after_id: The ID of the last player of the previous page, if any.
+            take: How many players to get.
+        """
+        if after_id is None:
+            return await cls.prisma().find_many(
+                where={"guild_id": guild_id},
+                order=[{"currency_amount": "desc"}, {"id": "asc"}],
+                take=take,
+            )
+
+        return await cls.prisma().find_many(
+            where={"guild_id": guild_id},
+            order=[{"currency_amount": "desc"}, {"id": "asc"}],
+            take=take,
+            skip=1,
+            cursor={"id": after_id},
+        )
 
-        if self.items and all(entry.item for entry in self.items):
-            str_builder.extend(
-                f"**{entry.item.name}** - {short_desc(entry.item.description)}"
-                for entry in self.items
+    @classmethod
+    async def add_currency(
+        cls, guild_id: int, user_id: int, amount: int
+    ) -> typing.Self:
+        """
+        Adds currency to a player, creating their data if needed.
+        The amount may be negative to remove currency instead.
+
+        Returns:
+            The player, with their new balance.
+        """
+        return await cls.prisma().query_first(  # type: ignore
+            ADD_CURRENCY_STR, int(guild_id), int(user_id), amount
+        )
+
+    @classmethod
+    async def add_currency_to_many(
+        cls, guild_id: int, user_ids: typing.Iterable[int], amount: int
+    ) -> int:
+        """
+        Adds currency to many players in one query, creating data for anyone
+        who does not have it yet.
+
+        Returns:
+            The number of players affected.
+        """
+        return await cls.prisma()._client.execute_raw(
+            BULK_ADD_CURRENCY_STR,
+            int(guild_id),
+            [int(user_id) for user_id in user_ids],
+            amount,
+        )
+
+    @classmethod
+    async def transfer_currency(
+        cls, guild_id: int, sender_id: int, recipient_id: int, amount: int
+    ) -> tuple[int, int] | None:
+        """
+        Moves currency from one player to another in a single transaction,
+        creating the recipient's data if needed.
+
+        Returns:
+            The new balances of the sender and recipient, or None if the sender
+            does not have enough currency.
+        """
+        async with cls.prisma()._client.tx() as tx:
+            sender = await tx.query_first(
+                WITHDRAW_CURRENCY_STR, amount, int(guild_id), int(sender_id)
             )
-        else:
-            str_builder.append("*No items.*")
-
-        if len(str_builder) <= 30:
-            return [
-                ipy.Embed(
-                    title=f"{user_display_name}'s Gacha Data",
-                    description="\n".join(str_builder),
-                    color=ipy.Color(int(os.environ["BOT_COLOR"])),
-                    timestamp=ipy.Timestamp.utcnow(),
-                )
-            ]
+            if not sender:
+                return None
 
-        chunks = [str_builder[x : x + 30] for x in range(0, len(str_builder), 30)]
+            # an upsert, so that two transfers to a new player can't race
+            recipient = await tx.query_first(
+                ADD_CURRENCY_STR, int(guild_id), int(recipient_id), amount
+            )
+
+        return int(sender["currency_amount"]), int(recipient["currency_amount"])
+
+    async def unique_item_count(self) -> int:
+        row = await self.prisma()._client.query_first(
+            PLAYER_UNIQUE_ITEM_COUNT_STR, self.id
+        )
+        return int(row["count"])
+
+    async def item_counts(
+        self, after: tuple[str, int] | None = None, take: int = 30
+    ) -> list[PlayerItemCount]:
+        """
+        Gets the items this player has, grouped together with how many of each
+        they have, ordered by name.
+
+        Args:
+            after: The name and ID of the last item of the previous page, if any.
+            take: How many items to get.
+        """
+        after_name, after_id = after or (None, None)
+        rows: list[dict[str, typing.Any]] = await self.prisma()._client.query_raw(
+            PLAYER_ITEM_COUNTS_STR, self.id, after_name, after_id, take
+        )
         return [
-            ipy.Embed(
-                title=f"{user_display_name}'s Gacha Data",
-                description="\n".join(chunk),
-                color=ipy.Color(int(os.environ["BOT_COLOR"])),
-                timestamp=ipy.Timestamp.utcnow(),
+            PlayerItemCount(
+                int(row["item_id"]),
+                row["name"],
+                row["description"],
+                int(row["count"]),
             )
-            for chunk in chunks
+            for row in rows
         ]
 
     async def save(self) -> None:
-        data = self.model_dump(exclude={"items", "gacha_config", "id", "guild_id"})
+        if not (data := self.changed_data()):
+            return
+
         await self.prisma().update(where={"id": self.id}, data=data)
+        self.mark_clean()
 
 
-class GachaConfig(GetMethodsMixin, PrismaGachaConfig):
+class GachaConfig(GetMethodsMixin, ChangeTrackingMixin, PrismaGachaConfig):
     items: "typing.Optional[list[GachaItem]]" = None
     players: "typing.Optional[list[GachaPlayer]]" = None
     main_config: "typing.Optional[GuildConfig]" = None
 
+    untracked_fields = frozenset({"items", "players", "main_config"})
+
     async def save(self) -> None:
-        data = self.model_dump(exclude={"items", "players", "main_config"})
+        if not (data := self.changed_data()):
+            return
+
         await self.prisma().update(where={"guild_id": self.guild_id}, data=data)  # type: ignore
+        self.mark_clean()
+        _update_cached_config(self.guild_id, "gacha", self)
 
 
 class MessageLink(PrismaMessageLink):
     message_config: typing.Optional["MessageConfig"] = None
 
+    @classmethod
+    async def link_many(cls, guild_id: int, links: dict[int, int]) -> None:
+        """
+        Creates or updates the links of many users at once, in a single
+        transaction.
+
+        Args:
+            guild_id: The ID of the guild.
+            links: The channel ID to link for each user ID.
+        """
+        async with cls.prisma()._client.tx() as tx:
+            await cls.prisma(tx).delete_many(
+                where={"guild_id": guild_id, "user_id": {"in": list(links)}}
+            )
+            await cls.prisma(tx).create_many(
+                data=[
+                    {"guild_id": guild_id, "user_id": user_id, "channel_id": channel_id}
+                    for user_id, channel_id in links.items()
+                ]
+            )
+
+    @classmethod
+    async def links_page(
+        cls, guild_id: int, after_id: int | None = None, take: int = 1000
+    ) -> list[typing.Self]:
+        """
+        Gets a page of a guild's links, in the order they were made.
+
+        Args:
+            guild_id: The ID of the guild.
+            after_id: The ID of the last link of the previous page, if any.
+            take: How many links to get.
+        """
+        if after_id is None:
+            return await cls.prisma().find_many(
+                where={"guild_id": guild_id}, order={"id": "asc"}, take=take
+            )
+
+        return await cls.prisma().find_many(
+            where={"guild_id": guild_id},
+            order={"id": "asc"},
+            take=take,
+            skip=1,
+            cursor={"id": after_id},
+        )
+
+
+class QueuedMessage(PrismaQueuedMessage):
+    @classmethod
+    async def claim_due(cls, limit: int, lock_for: int) -> list[typing.Self]:
+        """
+        Claims the queued messages that should be sent now, oldest first.
+
+        Claimed messages are kept from other claims until they're updated or
+        the lock runs out, so that two workers can't send the same message.
+        Messages queued after one in the same channel that's waiting to be
+        retried or is claimed already are left out, so that each channel's
+        messages stay in order.
+
+        Args:
+            limit: How many messages to claim at most.
+            lock_for: How long to keep the messages claimed for, in seconds.
+        """
+        entries = await cls.prisma().query_raw(
+            CLAIM_QUEUED_MESSAGES_STR, limit, lock_for
+        )
+        # RETURNING doesn't keep the order of the subquery
+        return sorted(entries, key=lambda entry: entry.id)
+
 
-class MessageConfig(PrismaMessageConfig):
+class MessageConfig(ChangeTrackingMixin, PrismaMessageConfig):
     links: typing.Optional[list["MessageLink"]] = None
     main_config: typing.Optional["GuildConfig"] = None
 
+    untracked_fields = frozenset({"main_config", "links"})
+
     async def save(self) -> None:
-        data = self.model_dump(exclude={"main_config", "links"})
+        if not (data := self.changed_data()):
+            return
+
         await self.prisma().update(where={"guild_id": self.guild_id}, data=data)  # type: ignore
+        self.mark_clean()
+        _update_cached_config(self.guild_id, "messages", self)
+
+
+GUILD_CONFIG_RELATIONS: typing.Final[tuple[str, ...]] = (
+    "names",
+    "bullets",
+    "gacha",
+    "messages",
+)
 
 
 class GuildConfigMixin:
@@ -360,6 +762,9 @@ class GuildConfigMixin:
         def prisma(cls) -> actions.PrismaGuildConfigActions[typing.Self]: ...
 
         model_dump: typing.Callable[..., dict[str, typing.Any]]
+        model_copy: typing.Callable[..., typing.Self]
+        changed_data: typing.Callable[[], dict[str, typing.Any]]
+        mark_clean: typing.Callable[..., None]
 
     async def _fill_in_include(
         self, include: PrismaGuildConfigInclude | None
@@ -388,26 +793,61 @@ class GuildConfigMixin:
 
         return self
 
+    @classmethod
+    def _get_cached(
+        cls, guild_id: int, include: PrismaGuildConfigInclude | None
+    ) -> typing.Optional[typing.Self]:
+        def _has_include(config: "GuildConfig") -> bool:
+            return not include or all(
+                getattr(config, entry, None) is not None
+                for entry, value in include.items()
+                if value
+            )
+
+        config = GUILD_CONFIG_CACHE.get(int(guild_id), validate=_has_include)
+        # copied so that changes only make it into the cache through save()
+        return config.model_copy(deep=True) if config else None  # type: ignore
+
+    def _store_in_cache(self) -> None:
+        config: GuildConfig = self.model_copy(deep=True)  # type: ignore
+
+        # keep any sub-configs that were loaded by previous calls
+        if cached := GUILD_CONFIG_CACHE.peek(int(self.guild_id)):
+            for entry in GUILD_CONFIG_RELATIONS:
+                if getattr(config, entry, None) is None:
+                    setattr(config, entry, getattr(cached, entry, None))
+
+        GUILD_CONFIG_CACHE[int(self.guild_id)] = config
+
     @classmethod
     async def get(
         cls, guild_id: int, include: PrismaGuildConfigInclude | None = None
     ) -> typing.Self:
+        if config := cls._get_cached(guild_id, include):
+            return config
+
         config = await cls.prisma().find_unique_or_raise(
             where={"guild_id": guild_id},
             include=include,
         )
-        return await config._fill_in_include(include)
+        config = await config._fill_in_include(include)
+        config._store_in_cache()
+        return config
 
     @classmethod
     async def get_or_none(
         cls, guild_id: int, include: PrismaGuildConfigInclude | None = None
     ) -> typing.Optional[typing.Self]:
+        if config := cls._get_cached(guild_id, include):
+            return config
+
         config = await cls.prisma().find_unique(
             where={"guild_id": guild_id}, include=include
         )
 
         if config:
             config = await config._fill_in_include(include)
+            config._store_in_cache()
 
         return config
 
@@ -415,42 +855,48 @@ class GuildConfigMixin:
     async def get_or_create(
         cls, guild_id: int, include: PrismaGuildConfigInclude | None = None
     ) -> typing.Self:
+        if config := cls._get_cached(guild_id, include):
+            return config
+
         config = await cls.prisma().find_unique(
             where={"guild_id": guild_id}, include=include
         ) or await cls.prisma().create(data={"guild_id": guild_id})
-        return await config._fill_in_include(include)
+        config = await config._fill_in_include(include)
+        config._store_in_cache()
+        return config
 
     async def save(self) -> None:
-        data = self.model_dump(
-            exclude={"names", "names_id", "bullets", "guild_id", "gacha", "messages"}
-        )
+        if not (data := self.changed_data()):
+            return
+
         await self.prisma().update(where={"guild_id": self.guild_id}, data=data)  # type: ignore
+        self.mark_clean()
+
+        for field, value in data.items():
+            _update_cached_config(self.guild_id, field, value)
 
 
-class GuildConfig(GuildConfigMixin, PrismaGuildConfig):
+class GuildConfig(GuildConfigMixin, ChangeTrackingMixin, PrismaGuildConfig):
     bullets: typing.Optional[BulletConfig] = None
     gacha: typing.Optional[GachaConfig] = None
     names: typing.Optional[Names] = None
+    messages: typing.Optional[MessageConfig] = None
 
+    untracked_fields = frozenset(
+        {"names", "names_id", "bullets", "guild_id", "gacha", "messages"}
+    )
 
-FIND_TRUTH_BULLET_STR: typing.Final[str] = (
-    f"""
-SELECT
-    {', '.join(TruthBullet.model_fields)}
+
+UNFOUND_CHANNEL_IDS_STR: typing.Final[str] = (
+    """
+SELECT DISTINCT
+    channel_id
 FROM
     thiatruthbullets
 WHERE
-    channel_id = $1
-    AND found = false
-    AND (
-        $2 ILIKE CONCAT('%', {generate_regexp('trigger')}, '%')
-        OR EXISTS (
-            SELECT 1
-            FROM unnest(aliases) AS alias
-            WHERE $2 ILIKE CONCAT('%', {generate_regexp('alias')}, '%')
-        )
-    );
-""".strip()  # noqa: S608
+    found = false
+    AND ($1::bigint IS NULL OR guild_id = $1);
+""".strip()
 )
 
 VALIDATE_TRUTH_BULLET_STR: typing.Final[str] = (
@@ -462,16 +908,24 @@ FROM
 WHERE
     channel_id = $1
     AND (
-        UPPER($2) = UPPER(trigger)
-        OR EXISTS (
-            SELECT 1
-            FROM unnest(aliases) AS alias
-            WHERE UPPER($2) = UPPER(alias)
-        )
+        lower(trigger) = lower($2)
+        OR thia_lower_array(aliases::text[]) @> ARRAY[lower($2)]
     );
 """.strip()
 )
 
+BULLET_NAMES_BY_CHANNEL_STR: typing.Final[str] = (
+    """
+SELECT
+    channel_id,
+    array_append(thia_lower_array(aliases::text[]), lower(trigger)) AS names
+FROM
+    thiatruthbullets
+WHERE
+    channel_id = ANY($1::bigint[]);
+""".strip()
+)
+
 FIND_TRUTH_BULLET_EXACT_STR: typing.Final[str] = (
     f"""
 SELECT
@@ -481,13 +935,239 @@ FROM
 WHERE
     channel_id = $1
     AND (
-        UPPER($2) = UPPER(trigger)
-        OR EXISTS (
-            SELECT 1
-            FROM unnest(aliases) AS alias
-            WHERE UPPER($2) = UPPER(alias)
-        )
+        lower(trigger) = lower($2)
+        OR thia_lower_array(aliases::text[]) @> ARRAY[lower($2)]
     );
+""".strip()
+)
+
+FIND_TRUTH_BULLET_BY_TRIGGER_STR: typing.Final[str] = (
+    f"""
+SELECT
+    {', '.join(TruthBullet.model_fields)}
+FROM
+    thiatruthbullets
+WHERE
+    channel_id = $1
+    AND lower(trigger) = lower($2)
+LIMIT 1;
+""".strip()
+)
+
+# % is pg_trgm's similarity operator
+SEARCH_TRUTH_BULLETS_STR: typing.Final[str] = (
+    f"""
+SELECT
+    {', '.join(TruthBullet.model_fields)}
+FROM
+    thiatruthbullets
+WHERE
+    channel_id = $1
+    AND (NOT $3::boolean OR found = false)
+    AND (starts_with(lower(trigger), $2::text) OR lower(trigger) % $2::text)
+ORDER BY
+    starts_with(lower(trigger), $2::text) DESC,
+    similarity(lower(trigger), $2::text) DESC,
+    id
+LIMIT $4;
+""".strip()
+)
+
+DELETE_TRUTH_BULLET_BY_TRIGGER_STR: typing.Final[str] = (
+    """
+DELETE FROM
+    thiatruthbullets
+WHERE
+    channel_id = $1
+    AND lower(trigger) = lower($2);
+""".strip()
+)
+
+OVERRIDE_TRUTH_BULLET_FINDER_STR: typing.Final[str] = (
+    """
+UPDATE
+    thiatruthbullets
+SET
+    found = true,
+    finder = $1
+WHERE
+    channel_id = $2
+    AND lower(trigger) = lower($3);
+""".strip()
+)
+
+# SKIP LOCKED lets a racing claim move on to the next possible bullet
+# instead of waiting on one it would fail to claim anyways
+CLAIM_TRUTH_BULLET_STR: typing.Final[str] = (
+    f"""
+UPDATE
+    thiatruthbullets
+SET
+    found = true,
+    finder = $1
+WHERE
+    id = (
+        SELECT id
+        FROM thiatruthbullets
+        WHERE id = ANY($2::int[]) AND found = false
+        ORDER BY array_position($2::int[], id)
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    AND found = false
+RETURNING
+    {', '.join(TruthBullet.model_fields)};
+""".strip()  # noqa: S608
+)
+
+CLAIM_TRUTH_BULLET_EXACT_STR: typing.Final[str] = (
+    f"""
+UPDATE
+    thiatruthbullets
+SET
+    found = true,
+    finder = $1
+WHERE
+    id = (
+        SELECT id
+        FROM thiatruthbullets
+        WHERE
+            channel_id = $2
+            AND found = false
+            AND (
+                lower(trigger) = lower($3)
+                OR thia_lower_array(aliases::text[]) @> ARRAY[lower($3)]
+            )
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    AND found = false
+RETURNING
+    {', '.join(TruthBullet.model_fields)};
+""".strip()  # noqa: S608
+)
+
+PLAYER_UNIQUE_ITEM_COUNT_STR: typing.Final[str] = (
+    """
+SELECT
+    COUNT(DISTINCT item_id) AS count
+FROM
+    thiagachaitemtoplayer
+WHERE
+    player_id = $1;
+""".strip()
+)
+
+PLAYER_ITEM_COUNTS_STR: typing.Final[str] = (
+    """
+SELECT
+    item.id AS item_id,
+    item.name,
+    LEFT(item.description, 26) AS description,
+    COUNT(*) AS count
+FROM
+    thiagachaitemtoplayer AS entry
+    JOIN thiagachaitems AS item ON item.id = entry.item_id
+WHERE
+    entry.player_id = $1
+    AND ($2::text IS NULL OR (item.name, item.id) > ($2::text, $3::int))
+GROUP BY
+    item.id
+ORDER BY
+    item.name, item.id
+LIMIT $4;
+""".strip()
+)
+
+WITHDRAW_CURRENCY_STR: typing.Final[str] = (
+    """
+UPDATE
+    thiagachaplayers
+SET
+    currency_amount = currency_amount - $1
+WHERE
+    guild_id = $2
+    AND user_id = $3
+    AND currency_amount >= $1
+RETURNING
+    currency_amount;
+""".strip()
+)
+
+ADD_CURRENCY_STR: typing.Final[str] = (
+    """
+INSERT INTO
+    thiagachaplayers (guild_id, user_id, currency_amount)
+VALUES
+    ($1, $2, $3)
+ON CONFLICT (guild_id, user_id) DO UPDATE SET
+    currency_amount = thiagachaplayers.currency_amount + EXCLUDED.currency_amount
+RETURNING
+    id, guild_id, user_id, currency_amount;
+""".strip()
+)
+
+BULK_ADD_CURRENCY_STR: typing.Final[str] = (
+    """
+INSERT INTO
+    thiagachaplayers (guild_id, user_id, currency_amount)
+SELECT
+    $1, user_id, $3
+FROM
+    unnest($2::bigint[]) AS user_id
+ON CONFLICT (guild_id, user_id) DO UPDATE SET
+    currency_amount = thiagachaplayers.currency_amount + EXCLUDED.currency_amount;
+""".strip()
+)
+
+FINDER_TALLY_STR: typing.Final[str] = (
+    """
+SELECT
+    finder,
+    COUNT(*) FILTER (WHERE found) AS found_count,
+    COUNT(*) FILTER (WHERE NOT found) AS unfound_count
+FROM
+    thiatruthbullets
+WHERE
+    guild_id = $1
+GROUP BY
+    finder;
+""".strip()
+)
+
+CLAIM_QUEUED_MESSAGES_STR: typing.Final[str] = (
+    f"""
+UPDATE
+    thiaqueuedmessages
+SET
+    locked_until = (now() AT TIME ZONE 'utc') + ($2::int * interval '1 second')
+WHERE
+    id IN (
+        SELECT entry.id
+        FROM thiaqueuedmessages AS entry
+        WHERE
+            entry.next_attempt_at <= (now() AT TIME ZONE 'utc')
+            AND (
+                entry.locked_until IS NULL
+                OR entry.locked_until <= (now() AT TIME ZONE 'utc')
+            )
+            AND NOT EXISTS (
+                SELECT 1
+                FROM thiaqueuedmessages AS earlier
+                WHERE
+                    earlier.channel_id = entry.channel_id
+                    AND earlier.id < entry.id
+                    AND (
+                        earlier.next_attempt_at > (now() AT TIME ZONE 'utc')
+                        OR earlier.locked_until > (now() AT TIME ZONE 'utc')
+                    )
+            )
+        ORDER BY entry.id
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    )
+RETURNING
+    {', '.join(QueuedMessage.model_fields)};
 """.strip()  # noqa: S608
 )
 
@@ -0,0 +1,139 @@
+"""
+Copyright 2021-2024 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import collections
+
+import interactions as ipy
+import typing_extensions as typing
+
+import common.caches as caches
+import common.models as models
+
+T = typing.TypeVar("T")
+
+
+class TriggerMatcher(typing.Generic[T]):
+    """
+    A small Aho-Corasick automaton.
+
+    Finds every pattern that appears in a piece of text in one pass over the text,
+    no matter how many patterns there are.
+    """
+
+    __slots__ = ("_fail", "_goto", "_output")
+
+    def __init__(self, patterns: typing.Iterable[tuple[str, T]]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._output: list[list[T]] = [[]]
+
+        for pattern, value in patterns:
+            if not pattern:
+                continue
+
+            node = 0
+            for char in pattern:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._output.append([])
+                node = next_node
+
+            self._output[node].append(value)
+
+        self._fail: list[int] = [0] * len(self._goto)
+
+        # breadth-first, so that the failure links of shallower nodes
+        # are always ready by the time we need them
+        queue: collections.deque[int] = collections.deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+
+            for char, child in self._goto[node].items():
+                queue.append(child)
+
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+
+                if node:
+                    self._fail[child] = self._goto[fallback].get(char, 0)
+
+                self._output[child].extend(self._output[self._fail[child]])
+
+    def __bool__(self) -> bool:
+        return bool(self._goto[0])
+
+    def search(self, text: str) -> typing.Iterator[T]:
+        """Yields the value of every pattern found in the text, in order of appearance."""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+
+            if output[node]:
+                yield from output[node]
+
+
+class ChannelTriggerIndex:
+    """
+    An in-memory index of the triggers and aliases of unfound Truth Bullets.
+
+    Channels are loaded lazily on their first message and should be invalidated
+    whenever one of their Truth Bullets changes.
+    """
+
+    def __init__(self) -> None:
+        self._matchers: caches.LazyKeyedCache[int, TriggerMatcher[int]] = (
+            caches.LazyKeyedCache(self._load)
+        )
+        self._guild_channels: collections.defaultdict[int, set[int]] = (
+            collections.defaultdict(set)
+        )
+
+    def __len__(self) -> int:
+        return len(self._matchers)
+
+    async def _load(self, channel_id: int) -> TriggerMatcher[int]:
+        bullets = await models.TruthBullet.prisma().find_many(
+            where={"channel_id": channel_id, "found": False}
+        )
+        if bullets:
+            self._guild_channels[bullets[0].guild_id].add(channel_id)
+
+        patterns: list[tuple[str, int]] = []
+        for bullet in bullets:
+            patterns.append((bullet.trigger.lower(), bullet.id))
+            patterns.extend((alias.lower(), bullet.id) for alias in bullet.aliases)
+
+        return TriggerMatcher(patterns)
+
+    async def find(self, channel_id: ipy.Snowflake_Type, content: str) -> list[int]:
+        """
+        Finds the IDs of all unfound Truth Bullets whose trigger or aliases
+        are in the content given, in order of appearance.
+        """
+        matcher = await self._matchers.get(int(channel_id))
+        if not matcher:
+            return []
+
+        return list(dict.fromkeys(matcher.search(content.lower())))
+
+    def invalidate(self, channel_id: ipy.Snowflake_Type) -> None:
+        self._matchers.invalidate(int(channel_id))
+
+    def invalidate_guild(self, guild_id: ipy.Snowflake_Type) -> None:
+        for channel_id in self._guild_channels.pop(int(guild_id), ()):
+            self.invalidate(channel_id)
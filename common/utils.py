@@ -7,9 +7,14 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
+import asyncio
+import csv
 import functools
+import io
+import json
 import logging
 import os
+import tempfile
 import traceback
 from pathlib import Path
 
@@ -18,6 +23,7 @@ import interactions as ipy
 import sentry_sdk
 import tansy
 import typing_extensions as typing
+import yaml
 from interactions.ext import hybrid_commands as hybrid
 from interactions.ext import prefixed_commands as prefixed
 from prisma.types import PrismaGuildConfigInclude
@@ -37,6 +43,8 @@ BOT_COLOR = ipy.Color(int(os.environ["BOT_COLOR"]))
 
 logger = logging.getLogger("uibot")
 
+T = TypeVar("T")
+
 
 @functools.wraps(tansy.slash_command)
 def manage_guild_slash_cmd(
@@ -184,6 +192,63 @@ def partial_channel(bot: "THIABase", channel_id: ipy.Snowflake_Type) -> ipy.Guil
     )  # type: ignore
 
 
+async def gather_limited(
+    items: typing.Iterable[T],
+    func: typing.Callable[[T], typing.Awaitable[typing.Any]],
+    *,
+    limit: int = 5,
+) -> list[tuple[T, Exception]]:
+    """
+    Runs a function on every item given, with at most a certain amount running at once.
+    Every item is attempted, even if some fail.
+
+    Returns:
+        The items that failed, along with the exception they raised.
+    """
+    semaphore = asyncio.Semaphore(limit)
+    failures: list[tuple[T, Exception]] = []
+
+    async def _run(item: T) -> None:
+        async with semaphore:
+            try:
+                await func(item)
+            except Exception as e:
+                failures.append((item, e))
+
+    await asyncio.gather(*(_run(item) for item in items))
+    return failures
+
+
+async def bulk_add_role(
+    bot: "THIABase",
+    guild_id: ipy.Snowflake_Type,
+    user_ids: typing.Iterable[ipy.Snowflake_Type],
+    role_id: ipy.Snowflake_Type,
+    *,
+    reason: str | None = None,
+) -> list[int]:
+    """
+    Gives a role to many users at once.
+
+    Requests are made concurrently, with the HTTP client's rate limit handling
+    queuing them up as needed. This skips fetching each member, as we don't need them.
+
+    Returns:
+        The IDs of the users the role could not be given to.
+    """
+
+    async def _add_role(user_id: ipy.Snowflake_Type) -> None:
+        await bot.http.add_guild_member_role(guild_id, user_id, role_id, reason=reason)
+
+    failures = await gather_limited(user_ids, _add_role)
+    for user_id, error in failures:
+        if not isinstance(error, ipy.errors.HTTPException):
+            logger.warning(
+                "Failed to give role %s to %s.", role_id, user_id, exc_info=error
+            )
+    return [int(user_id) for user_id, _ in failures]
+
+
 def role_check(ctx: ipy.BaseContext, role: ipy.Role) -> ipy.Role:
     top_role = ctx.guild.me.top_role
 
@@ -243,6 +308,191 @@ class ValidChannelConverter(ipy.Converter):
         return valid_channel_check(argument, ctx.app_permissions)
 
 
+async def check_channels(
+    ctx: ipy.BaseContext, channel_ids: typing.Iterable[int]
+) -> tuple[dict[int, GuildMessageable], dict[int, str]]:
+    """
+    Fetches many channels of the guild at once and checks that the bot can send
+    messages in them.
+
+    Returns:
+        The channels that passed, and why each channel that didn't failed.
+    """
+
+    async def check(channel_id: int) -> GuildMessageable:
+        try:
+            channel = await ctx.bot.fetch_channel(channel_id)
+        except ipy.errors.HTTPException:
+            channel = None
+
+        if not channel or getattr(channel, "_guild_id", None) != ctx.guild_id:
+            raise ipy.errors.BadArgument(f"Channel {channel_id} was not found.")
+        return valid_channel_check(channel, ctx.guild.me.channel_permissions(channel))
+
+    channel_ids = list(dict.fromkeys(channel_ids))
+    results = await asyncio.gather(
+        *(check(channel_id) for channel_id in channel_ids), return_exceptions=True
+    )
+
+    valid: dict[int, GuildMessageable] = {}
+    invalid: dict[int, str] = {}
+    for channel_id, result in zip(channel_ids, results, strict=True):
+        if isinstance(result, ipy.errors.BadArgument):
+            invalid[channel_id] = str(result)
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            valid[channel_id] = result
+
+    return valid, invalid
+
+
+# how many skipped entries are listed in the reply of a bulk command
+MAX_LISTED_PROBLEMS: typing.Final[int] = 20
+
+
+async def chunk_if_needed(guild: ipy.Guild) -> None:
+    """Chunks a guild, but only if some of its members aren't cached."""
+    if not guild.chunked.is_set() and len(guild._member_ids) < guild.member_count:
+        await guild.chunk()
+
+
+def skipped_summary(
+    summary: str, problems: typing.Sequence[str], *, more_hint: str = ""
+) -> str:
+    """
+    Builds the reply of a bulk command, listing what was skipped under the
+    summary. Only the first few problems are listed.
+
+    Args:
+        summary: What the command did.
+        problems: Why each skipped entry was skipped.
+        more_hint: Appended to the line saying how many problems weren't listed.
+    """
+    str_builder = [summary]
+    if problems:
+        str_builder.extend(("", "Skipped:"))
+        str_builder.extend(problems[:MAX_LISTED_PROBLEMS])
+        if len(problems) > MAX_LISTED_PROBLEMS:
+            str_builder.append(
+                f"...and {len(problems) - MAX_LISTED_PROBLEMS} more.{more_hint}"
+            )
+    return "\n".join(str_builder)
+
+
+# the biggest file that will be read for imports, in bytes
+MAX_IMPORT_SIZE: typing.Final[int] = 1024 * 1024
+
+
+async def read_import_file(
+    bot: ipy.Client, attachment: ipy.Attachment
+) -> list[tuple[int, dict[str, typing.Any]]]:
+    """
+    Reads the rows of a JSON, CSV or YAML file attached to a command.
+
+    JSON and YAML files should be a list of objects, while CSV files should
+    start with a header row.
+
+    Returns:
+        Each row along with its row number, for use in error messages. For CSV
+        files, this counts the header like a spreadsheet would.
+    """
+    file_type = Path(attachment.filename).suffix.lower()
+    if file_type not in {".json", ".csv", ".yaml", ".yml"}:
+        raise ipy.errors.BadArgument("The file must be a JSON, CSV or YAML file.")
+    if attachment.size > MAX_IMPORT_SIZE:
+        raise ipy.errors.BadArgument("The file must be at most 1 MB.")
+
+    try:
+        text = (await bot.http.request_cdn(attachment.url, attachment)).decode(
+            "utf-8-sig"
+        )
+    except UnicodeDecodeError:
+        raise ipy.errors.BadArgument("The file must be UTF-8 encoded.") from None
+
+    if file_type == ".csv":
+        reader = csv.DictReader(io.StringIO(text))
+        try:
+            return [(reader.line_num, row) for row in reader]
+        except csv.Error as e:
+            raise ipy.errors.BadArgument(f"The file is not valid CSV: {e}") from None
+
+    if file_type == ".json":
+        try:
+            rows = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ipy.errors.BadArgument(f"The file is not valid JSON: {e}") from None
+    else:
+        try:
+            rows = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ipy.errors.BadArgument(f"The file is not valid YAML: {e}") from None
+
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ipy.errors.BadArgument("The file must be a list of objects.")
+    return list(enumerate(rows, start=1))
+
+
+# how many rows are fetched at once when exporting to a CSV file
+EXPORT_PAGE_SIZE: typing.Final[int] = 1000
+
+# how big an export can get before it's moved from memory to disk, in bytes
+EXPORT_SPOOL_SIZE: typing.Final[int] = 1024 * 1024
+
+
+class _Identified(typing.Protocol):
+    id: int
+
+
+IdentifiedT = TypeVar("IdentifiedT", bound=_Identified)
+
+
+async def export_csv(
+    file_name: str,
+    header: typing.Sequence[str],
+    fetch_page: typing.Callable[[int | None, int], typing.Awaitable[list[IdentifiedT]]],
+    to_row: typing.Callable[[IdentifiedT], typing.Iterable[typing.Any]],
+) -> ipy.File:
+    """
+    Writes every row of a paginated query to a CSV file.
+
+    Pages are written as they are fetched to a file that moves itself to
+    disk once it gets too big, so large exports don't have to be held in
+    memory all at once.
+
+    Args:
+        file_name: The name of the file to upload.
+        header: The header row of the file.
+        fetch_page: Gets the page after the row with the given ID, of at most
+            the given size.
+        to_row: Turns a fetched row into the values to write for it.
+
+    Returns:
+        The file to send. Use it as a context manager so that it is closed
+        once it has been sent.
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+
+    after_id: int | None = None
+    while True:
+        rows = await fetch_page(after_id, EXPORT_PAGE_SIZE)
+        writer.writerows(to_row(row) for row in rows)
+
+        output.write(buffer.getvalue().encode())
+        buffer.seek(0)
+        buffer.truncate()
+
+        if len(rows) < EXPORT_PAGE_SIZE:
+            break
+        after_id = rows[-1].id
+
+    output.seek(0)
+    return ipy.File(output, file_name=file_name)
+
+
 async def _global_checks(ctx: ipy.BaseContext) -> bool:
     return bool(ctx.guild) if ctx.bot.is_ready else False
 
@@ -257,13 +507,14 @@ class Extension(ipy.Extension):
 
 
 if typing.TYPE_CHECKING:
-    import asyncio
-    import collections
-
     from interactions.ext.prefixed_commands import PrefixedInjectedClient
     from prisma import Prisma
 
+    from .caches import StatsTTLCache
+    from .gacha import GachaPools
     from .help_tools import MiniCommand, PermissionsResolver
+    from .messaging import MessageLinks, MessageOutbox, MessageRelay
+    from .triggers import ChannelTriggerIndex
 
     class THIABase(PrefixedInjectedClient):
         hybrid: hybrid.HybridManager
@@ -271,9 +522,15 @@ if typing.TYPE_CHECKING:
         owner: ipy.User
         color: ipy.Color
         background_tasks: set[asyncio.Task]
-        slash_perms_cache: collections.defaultdict[int, dict[int, PermissionsResolver]]
-        mini_commands_per_scope: dict[int, dict[str, MiniCommand]]
+        slash_perms_cache: StatsTTLCache[int, dict[int, PermissionsResolver]]
+        mini_commands_per_scope: dict[int, typing.Mapping[str, MiniCommand]]
         msg_enabled_bullets_guilds: set[int]
+        bullet_triggers: ChannelTriggerIndex
+        unfound_bullet_channels: set[int]
+        gacha_pools: GachaPools
+        message_links: MessageLinks
+        message_relay: MessageRelay
+        message_outbox: MessageOutbox
 
         @property
         def guild_count(self) -> int: ...
@@ -8,10 +8,13 @@ file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
 import collections
+import csv
 import importlib
+import io
 
 import interactions as ipy
 import tansy
+import typing_extensions as typing
 
 import common.fuzzy as fuzzy
 import common.help_tools as help_tools
@@ -32,6 +35,69 @@ def convert_to_bool(argument: str) -> bool:
     raise ipy.errors.BadArgument(f"{argument} is not a recognised boolean option.")
 
 
+class ImportedBullet(typing.NamedTuple):
+    row: int
+    channel_id: int
+    trigger: str
+    aliases: list[str]
+    hidden: bool
+    description: str
+
+
+def parse_import_row(
+    channel_ids: dict[str, int], row: dict[str, typing.Any]
+) -> tuple[int, str, list[str], bool, str]:
+    """
+    Turns a row of an imported file into the channel ID, trigger, aliases,
+    hidden setting and description of a Truth Bullet.
+
+    Channels can be given by mention, ID or name, using channel_ids to look
+    up the ID of a channel's name.
+    """
+    raw_channel = str(row.get("channel") or "").strip()
+    if raw_channel.removeprefix("<#").removesuffix(">").isdigit():
+        channel_id = int(raw_channel.removeprefix("<#").removesuffix(">"))
+    elif (named_id := channel_ids.get(raw_channel.removeprefix("#"))) is not None:
+        channel_id = named_id
+    else:
+        raise ipy.errors.BadArgument(f"channel `{raw_channel}` was not found.")
+
+    trigger = str(row.get("trigger") or "").strip()
+    if not trigger:
+        raise ipy.errors.BadArgument("no trigger given.")
+    if len(trigger) > 60:
+        raise ipy.errors.BadArgument("the trigger is over 60 characters.")
+
+    raw_aliases = row.get("aliases") or []
+    if isinstance(raw_aliases, str):
+        # csv files can't have lists, so aliases are split by |
+        raw_aliases = raw_aliases.split("|")
+    if not isinstance(raw_aliases, list):
+        raise ipy.errors.BadArgument("the aliases are not a list.")
+
+    aliases = [alias for alias in (str(a).strip() for a in raw_aliases) if alias]
+    if len(aliases) > 5:
+        raise ipy.errors.BadArgument("there are more than 5 aliases.")
+    if any(len(alias) > 40 for alias in aliases):
+        raise ipy.errors.BadArgument("an alias is over 40 characters.")
+
+    raw_hidden = row.get("hidden")
+    if isinstance(raw_hidden, bool):
+        hidden = raw_hidden
+    elif raw_hidden is None or not str(raw_hidden).strip():
+        hidden = False
+    else:
+        hidden = convert_to_bool(str(raw_hidden).strip())
+
+    description = str(row.get("description") or "").strip()
+    if not description:
+        raise ipy.errors.BadArgument("no description given.")
+    if len(description) > 3900:
+        raise ipy.errors.BadArgument("the description is over 3900 characters.")
+
+    return channel_id, trigger, aliases, hidden, description
+
+
 class BulletCMDs(utils.Extension):
     """Commands for using and modifying Truth Bullets."""
 
@@ -171,6 +237,9 @@ class BulletCMDs(utils.Extension):
                     "hidden": hidden,
                 }
             )
+            self.bot.bullet_triggers.invalidate(channel_id)
+            fuzzy.invalidate_bullet_autocomplete(ctx.guild_id, channel_id)
+            self.bot.unfound_bullet_channels.add(channel_id)
 
             await ctx.send(
                 embed=utils.make_embed(
@@ -179,6 +248,121 @@ class BulletCMDs(utils.Extension):
                 ),
             )
 
+    @config.subcommand(
+        "import",
+        sub_cmd_description="Adds many Truth Bullets at once from a file.",
+    )
+    async def import_bullets(
+        self,
+        ctx: utils.THIASlashContext,
+        file: ipy.Attachment = tansy.Option(
+            "A JSON/CSV/YAML file with a channel, trigger, aliases, hidden and"
+            " description for each."
+        ),
+    ) -> None:
+        rows = await utils.read_import_file(self.bot, file)
+        if not rows:
+            raise ipy.errors.BadArgument("The file has no Truth Bullets in it.")
+
+        # row number -> what happened to it
+        report: dict[int, str] = {}
+        parsed: list[ImportedBullet] = []
+
+        # reversed, so the first channel with a name is the one that's kept
+        channel_ids = {
+            channel.name: int(channel.id) for channel in reversed(ctx.guild.channels)
+        }
+
+        for index, row in rows:
+            try:
+                parsed.append(
+                    ImportedBullet(index, *parse_import_row(channel_ids, row))
+                )
+            except ipy.errors.BadArgument as e:
+                report[index] = f"Skipped: {e}"
+
+        valid_channels, invalid_channels = await utils.check_channels(
+            ctx, (bullet.channel_id for bullet in parsed)
+        )
+        # the same channels add allows
+        for channel_id, channel in tuple(valid_channels.items()):
+            if not isinstance(channel, ipy.GuildText | ipy.GuildPublicThread):
+                invalid_channels[channel_id] = (
+                    f"{channel.name} is not a text channel or public thread."
+                )
+                del valid_channels[channel_id]
+        names_by_channel = await models.TruthBullet.names_by_channel(valid_channels)
+
+        to_add: list[ImportedBullet] = []
+        for bullet in parsed:
+            if bullet.channel_id in invalid_channels:
+                report[bullet.row] = f"Skipped: {invalid_channels[bullet.channel_id]}"
+                continue
+
+            channel_names = names_by_channel[bullet.channel_id]
+            names = [bullet.trigger.lower(), *(a.lower() for a in bullet.aliases)]
+
+            if taken := next((name for name in names if name in channel_names), None):
+                report[bullet.row] = (
+                    f"Skipped: `{taken}` is already a trigger or alias in"
+                    f" <#{bullet.channel_id}>."
+                )
+            elif len(set(names)) < len(names):
+                report[bullet.row] = "Skipped: the trigger and aliases repeat."
+            else:
+                # also catches duplicates later on in the file
+                channel_names.update(names)
+                to_add.append(bullet)
+                report[bullet.row] = (
+                    f"Added `{bullet.trigger}` to <#{bullet.channel_id}>."
+                )
+
+        if to_add:
+            await models.TruthBullet.prisma().create_many(
+                data=[
+                    {
+                        "trigger": bullet.trigger,
+                        "aliases": bullet.aliases,
+                        "description": bullet.description,
+                        "channel_id": bullet.channel_id,
+                        "guild_id": ctx.guild_id,
+                        "found": False,
+                        "finder": None,
+                        "hidden": bullet.hidden,
+                    }
+                    for bullet in to_add
+                ]
+            )
+
+            for channel_id in {bullet.channel_id for bullet in to_add}:
+                self.bot.bullet_triggers.invalidate(channel_id)
+                fuzzy.invalidate_bullet_autocomplete(ctx.guild_id, channel_id)
+                self.bot.unfound_bullet_channels.add(channel_id)
+
+        problems = [
+            f"Row {index}: {result.removeprefix('Skipped: ')}"
+            for index, result in sorted(report.items())
+            if result.startswith("Skipped: ")
+        ]
+
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(("row", "result"))
+        writer.writerows(sorted(report.items()))
+
+        await ctx.send(
+            embed=utils.make_embed(
+                utils.skipped_summary(
+                    f"Added {len(to_add)} of {len(rows)} Truth Bullet(s).",
+                    problems,
+                    more_hint=" See the report for all of them.",
+                )
+            ),
+            file=ipy.File(
+                io.BytesIO(output.getvalue().encode()), file_name="import_report.csv"
+            ),
+        )
+
     @config.subcommand(
         "remove",
         sub_cmd_description="Removes a Truth Bullet from the list of Truth Bullets.",
@@ -193,17 +377,13 @@ class BulletCMDs(utils.Extension):
             "The trigger of the Truth Bullet to be removed.", autocomplete=True
         ),
     ) -> None:
-        num_deleted = await models.TruthBullet.prisma().delete_many(
-            where={
-                "channel_id": channel.id,
-                "trigger": {
-                    "equals": models.escape_ilike(trigger),
-                    "mode": "insensitive",
-                },
-            }
-        )
+        num_deleted = await models.TruthBullet.delete_by_trigger(channel.id, trigger)
 
         if num_deleted > 0:
+            self.bot.bullet_triggers.invalidate(channel.id)
+            fuzzy.invalidate_bullet_autocomplete(ctx.guild_id, channel.id)
+            if not await models.TruthBullet.channel_has_unfound(channel.id):
+                self.bot.unfound_bullet_channels.discard(int(channel.id))
             await ctx.send(
                 embed=utils.make_embed(
                     f"Truth Bullet with trigger `{trigger}` removed from"
@@ -223,13 +403,17 @@ class BulletCMDs(utils.Extension):
         ),
     )
     async def clear_bullets(self, ctx: utils.THIASlashContext) -> None:
+        unfound_channel_ids = await models.TruthBullet.unfound_channel_ids(ctx.guild_id)
         num_deleted = await models.TruthBullet.prisma().delete_many(
             where={"guild_id": ctx.guild_id}
         )
+        self.bot.unfound_bullet_channels.difference_update(unfound_channel_ids)
 
         # just to give a more clear indication to users
         # technically everything's fine without this
         if num_deleted > 0:
+            self.bot.bullet_triggers.invalidate_guild(ctx.guild_id)
+            fuzzy.invalidate_bullet_autocomplete(ctx.guild_id)
             await ctx.send(
                 embed=utils.make_embed("Cleared all Truth Bullets for this server!")
             )
@@ -404,6 +588,8 @@ class BulletCMDs(utils.Extension):
             possible_bullet.description = ctx.responses["truth_bullet_desc"]
             possible_bullet.hidden = hidden
             await possible_bullet.save()
+            self.bot.bullet_triggers.invalidate(channel_id)
+            fuzzy.invalidate_bullet_autocomplete(ctx.guild_id, channel_id)
 
             if possible_bullet.trigger != trigger:
                 await ctx.send(
@@ -446,6 +632,9 @@ class BulletCMDs(utils.Extension):
         possible_bullet.found = False
         possible_bullet.finder = None
         await possible_bullet.save()
+        self.bot.bullet_triggers.invalidate(channel.id)
+        fuzzy.invalidate_bullet_autocomplete(ctx.guild_id, channel.id)
+        self.bot.unfound_bullet_channels.add(int(channel.id))
 
         await ctx.send(embed=utils.make_embed("Truth Bullet un-found!"))
 
@@ -466,17 +655,15 @@ class BulletCMDs(utils.Extension):
         ),
         user: ipy.Member = tansy.Option("The user who will find the Truth Bullet."),
     ) -> None:
-        possible_bullet = await models.TruthBullet.find_possible_bullet(
-            channel.id, trigger
-        )
-        if not possible_bullet:
+        if not await models.TruthBullet.override_finder(channel.id, trigger, user.id):
             raise ipy.errors.BadArgument(
                 f"Truth Bullet with `{trigger}` does not exist!"
             )
 
-        possible_bullet.found = True
-        possible_bullet.finder = user.id
-        await possible_bullet.save()
+        self.bot.bullet_triggers.invalidate(channel.id)
+        fuzzy.invalidate_bullet_autocomplete(ctx.guild_id, channel.id)
+        if not await models.TruthBullet.channel_has_unfound(channel.id):
+            self.bot.unfound_bullet_channels.discard(int(channel.id))
 
         await ctx.send(embed=utils.make_embed("Truth Bullet overrided and found!"))
 
@@ -502,18 +689,7 @@ class BulletCMDs(utils.Extension):
                 + "Please use something at or under 40 characters."
             )
 
-        if (
-            await models.TruthBullet.prisma().count(
-                where={
-                    "channel_id": channel.id,
-                    "trigger": {
-                        "equals": models.escape_ilike(alias),
-                        "mode": "insensitive",
-                    },
-                }
-            )
-            > 0
-        ):
+        if await models.TruthBullet.find_possible_bullet(channel.id, alias):
             raise ipy.errors.BadArgument(
                 f"Alias `{alias}` is used as a trigger for another Truth Bullet for"
                 " this channel!"
@@ -539,6 +715,8 @@ class BulletCMDs(utils.Extension):
 
         possible_bullet.aliases.add(alias)
         await possible_bullet.save()
+        self.bot.bullet_triggers.invalidate(channel.id)
+        fuzzy.invalidate_bullet_autocomplete(ctx.guild_id, channel.id)
 
         await ctx.send(
             embed=utils.make_embed(
@@ -578,6 +756,8 @@ class BulletCMDs(utils.Extension):
             ) from None
 
         await possible_bullet.save()
+        self.bot.bullet_triggers.invalidate(channel.id)
+        fuzzy.invalidate_bullet_autocomplete(ctx.guild_id, channel.id)
 
         await ctx.send(
             embed=utils.make_embed(
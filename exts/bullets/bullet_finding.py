@@ -8,7 +8,6 @@ file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
 import asyncio
-import collections
 import importlib
 
 import interactions as ipy
@@ -30,6 +29,16 @@ async def player_check(ctx: utils.THIASlashContext) -> bool:
     return True
 
 
+def log_failures(
+    bullet: models.TruthBullet, results: typing.Iterable[typing.Any]
+) -> None:
+    for result in results:
+        if isinstance(result, BaseException):
+            utils.logger.warning(
+                "Failed to announce Truth Bullet %s.", bullet.id, exc_info=result
+            )
+
+
 class BulletFinding(utils.Extension):
     """The cog that deals with finding Truth Bullets."""
 
@@ -42,25 +51,14 @@ class BulletFinding(utils.Extension):
         bullet_chan: ipy.GuildText | None,
         config: models.GuildConfig,
     ) -> None:
-        if (
-            await models.TruthBullet.prisma().count(
-                where={"guild_id": guild.id, "found": False}
-            )
-            > 0
-        ):
+        remaining, counter = await models.TruthBullet.finder_tally(guild.id)
+        if remaining > 0 or not counter:
             return
 
         if typing.TYPE_CHECKING:
             assert config.bullets is not None
             assert config.names is not None
 
-        counter: collections.Counter[int] = collections.Counter()
-
-        for bullet in await models.TruthBullet.prisma().find_many(
-            where={"guild_id": guild.id}
-        ):
-            counter[bullet.finder] += 1  # type: ignore
-
         most_found = counter.most_common(None)
 
         # number of truth bullets found by highest person
@@ -112,19 +110,24 @@ class BulletFinding(utils.Extension):
                 config.bullets.best_bullet_finder_role
             )
         ):
-            for person_id in most_found_people:
-                try:
-                    # use an internal method to save on an http request
-                    # we get to skip out on asking for the member, which was
-                    # pointless to do for our needs
-                    # but dont do this unless you're me
-
-                    await self.bot.http.add_guild_member_role(
-                        guild.id, person_id, best_bullet_finder_obj.id
-                    )
-                    await asyncio.sleep(1)  # we don't want to trigger ratelimits
-                except ipy.errors.HTTPException:
-                    continue
+            failed = await utils.bulk_add_role(
+                self.bot, guild.id, most_found_people, best_bullet_finder_obj.id
+            )
+            if failed:
+                await bullet_chan.send(
+                    f"Could not give {best_bullet_finder_obj.mention} to:"
+                    f" {', '.join(f'<@{user_id}>' for user_id in failed)}.",
+                    allowed_mentions=ipy.AllowedMentions.none(),
+                )
+
+    async def refresh_channel_state(
+        self, guild_id: ipy.Snowflake_Type, channel_id: ipy.Snowflake_Type
+    ) -> None:
+        # should be called after a truth bullet in the channel is found
+        self.bot.bullet_triggers.invalidate(channel_id)
+        fuzzy.invalidate_bullet_autocomplete(guild_id, channel_id)
+        if not await models.TruthBullet.channel_has_unfound(channel_id):
+            self.bot.unfound_bullet_channels.discard(int(channel_id))
 
     @ipy.listen("message_create")
     async def on_message(self, event: ipy.events.MessageCreate) -> None:
@@ -143,6 +146,17 @@ class BulletFinding(utils.Extension):
         if int(message.guild.id) not in self.bot.msg_enabled_bullets_guilds:
             return
 
+        if int(message.channel.id) not in self.bot.unfound_bullet_channels:
+            return
+
+        # the index is all in-memory once loaded, so most messages end here
+        # without ever touching the database
+        possible_ids = await self.bot.bullet_triggers.find(
+            message.channel.id, message.content
+        )
+        if not possible_ids:
+            return
+
         config = await models.GuildConfig.get_or_none(
             guild_id=message.guild.id, include={"bullets": True, "names": True}
         )
@@ -169,49 +183,55 @@ class BulletFinding(utils.Extension):
                 self.bot.msg_enabled_bullets_guilds.discard(int(message.guild.id))
             return
 
-        bullet_found = await models.TruthBullet.find(
-            message.channel.id, message.content
+        # persist the find before announcing it, so that only one person
+        # can ever get it
+        bullet_found = await models.TruthBullet.claim_first(
+            possible_ids, message.author.id
         )
         if not bullet_found:
+            # the index was out of date
+            self.bot.bullet_triggers.invalidate(message.channel.id)
             return
 
-        bullet_found.found = True
-        bullet_found.finder = message.author.id
-
         bullet_chan: ipy.GuildText | None = None
-        embed = bullet_found.found_embed(
-            str(message.author), config.names.singular_bullet
-        )
 
         if not bullet_found.hidden:
             bullet_chan = await self.bot.fetch_channel(config.bullets.bullet_chan_id)
             if not bullet_chan or not isinstance(bullet_chan, SendMixin):
+                await bullet_found.unclaim()
                 config.bullets.bullets_enabled = False
                 self.bot.msg_enabled_bullets_guilds.discard(int(message.guild.id))
                 config.bullets.bullet_chan_id = None
                 await config.bullets.save()
                 return
 
-            new_msg = await message.reply(embed=embed)
-            await bullet_chan.send(
-                embed=embed,
-                components=ipy.Button(
-                    style=ipy.ButtonStyle.LINK,
-                    label="Context",
-                    url=new_msg.jump_url,
-                ),
+        embed = bullet_found.found_embed(
+            str(message.author), config.names.singular_bullet
+        )
+        context_button = ipy.Button(
+            style=ipy.ButtonStyle.LINK,
+            label="Context",
+            url=message.jump_url,
+        )
+
+        if bullet_chan:
+            # the bullet is already claimed, so one of these failing shouldn't
+            # stop the game from being able to finish
+            results = await asyncio.gather(
+                message.reply(embed=embed),
+                bullet_chan.send(embed=embed, components=context_button),
+                self.refresh_channel_state(message.guild.id, message.channel.id),
+                return_exceptions=True,
             )
+            log_failures(bullet_found, results)
         else:
             try:
-                await message.author.send(
-                    embed=embed,
-                    components=ipy.Button(
-                        style=ipy.ButtonStyle.LINK,
-                        label="Context",
-                        url=message.jump_url,
-                    ),
-                )
+                await message.author.send(embed=embed, components=context_button)
             except ipy.errors.HTTPException:
+                # give it back so they can try again
+                await bullet_found.unclaim()
+                self.bot.bullet_triggers.invalidate(message.channel.id)
+
                 await message.channel.send(
                     f"{message.author.mention}, I couldn't DM you a(n)"
                     f" {config.names.singular_bullet}. Please enable DMs for this"
@@ -220,7 +240,8 @@ class BulletFinding(utils.Extension):
                 )
                 return
 
-        await bullet_found.save()
+            await self.refresh_channel_state(message.guild.id, message.channel.id)
+
         await self.check_for_finish(message.guild, bullet_chan, config)
 
     @tansy.slash_command(
@@ -248,46 +269,65 @@ class BulletFinding(utils.Extension):
                 f"{config.names.plural_bullet} are not enabled in this server."
             )
 
-        truth_bullet = await models.TruthBullet.find_exact(ctx.channel_id, trigger)
+        truth_bullet = await models.TruthBullet.claim_by_trigger(
+            ctx.channel_id, trigger, ctx.author.id
+        )
         if not truth_bullet:
+            # only bother figuring out why if we need to
+            if await models.TruthBullet.find_exact(ctx.channel_id, trigger):
+                raise utils.CustomCheckFailure(
+                    f"This {config.names.singular_bullet} has already been found."
+                )
             raise utils.CustomCheckFailure(
                 f"No {config.names.singular_bullet} found with this trigger."
             )
 
-        if truth_bullet.found:
-            raise utils.CustomCheckFailure(
-                f"This {config.names.singular_bullet} has already been found."
-            )
-
-        await ctx.defer(ephemeral=truth_bullet.hidden)
-
-        truth_bullet.found = True
-        truth_bullet.finder = ctx.author.id
-
         bullet_chan: ipy.GuildText | None = None
-        embed = truth_bullet.found_embed(str(ctx.author), config.names.singular_bullet)
-
-        message = await ctx.send(embed=embed, ephemeral=ctx.ephemeral)
 
         if not truth_bullet.hidden:
             bullet_chan = await self.bot.fetch_channel(config.bullets.bullet_chan_id)
             if not bullet_chan or not isinstance(bullet_chan, SendMixin):
+                await truth_bullet.unclaim()
                 config.bullets.bullets_enabled = False
                 self.bot.msg_enabled_bullets_guilds.discard(int(ctx.guild_id))
                 config.bullets.bullet_chan_id = None
                 await config.bullets.save()
-                return
+                raise utils.CustomCheckFailure(
+                    f"The {config.names.singular_bullet} channel could not be"
+                    f" found, so {config.names.plural_bullet} have been disabled."
+                )
 
-            await bullet_chan.send(
-                embed=embed,
-                components=ipy.Button(
-                    style=ipy.ButtonStyle.LINK,
-                    label="Context",
-                    url=message.jump_url,
-                ),
-            )
+        await ctx.defer(ephemeral=truth_bullet.hidden)
+
+        embed = truth_bullet.found_embed(str(ctx.author), config.names.singular_bullet)
+
+        # the bullet channel's context button needs the response, but updating
+        # the channel's state doesn't - and as the bullet is already claimed,
+        # failures are only logged so that the game can still finish
+        message, refreshed = await asyncio.gather(
+            ctx.send(embed=embed, ephemeral=ctx.ephemeral),
+            self.refresh_channel_state(ctx.guild_id, ctx.channel_id),
+            return_exceptions=True,
+        )
+        log_failures(truth_bullet, (message, refreshed))
+
+        if bullet_chan:
+            try:
+                await bullet_chan.send(
+                    embed=embed,
+                    components=(
+                        ipy.Button(
+                            style=ipy.ButtonStyle.LINK,
+                            label="Context",
+                            url=message.jump_url,
+                        )
+                        if isinstance(message, ipy.Message)
+                        else []
+                    ),
+                )
+            except Exception as e:
+                log_failures(truth_bullet, (e,))
 
-        await truth_bullet.save()
         await self.check_for_finish(ctx.guild, bullet_chan, config)
 
     config = tansy.SlashCommand(
@@ -34,6 +34,8 @@ class EtcEvents(ipy.Extension):
         await models.GuildConfig.prisma().delete(
             where={"guild_id": int(event.guild_id)}
         )
+        models.invalidate_guild_config(event.guild_id)
+        self.bot.message_links.invalidate(event.guild_id)
 
         # doesn't get deleted by cascade
         await models.GachaPlayer.prisma().delete_many(
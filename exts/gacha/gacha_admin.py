@@ -7,8 +7,9 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
-import asyncio
+import functools
 import importlib
+import math
 import re
 
 import interactions as ipy
@@ -16,6 +17,7 @@ import tansy
 import typing_extensions as typing
 
 import common.fuzzy as fuzzy
+import common.gacha as gacha
 import common.help_tools as help_tools
 import common.models as models
 import common.utils as utils
@@ -24,6 +26,9 @@ HTTP_URL_REGEX = re.compile(
     r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
 )
 
+# how many players are shown on each page of list-currency-amounts
+CURRENCY_PAGE_SIZE = 25
+
 
 class GachaManagement(utils.Extension):
     def __init__(self, bot: utils.THIABase) -> None:
@@ -102,6 +107,7 @@ class GachaManagement(utils.Extension):
         await models.GachaConfig.prisma().update(
             data={"enabled": toggle}, where={"guild_id": ctx.guild_id}
         )
+        models.invalidate_guild_config(ctx.guild_id)
 
         await ctx.send(
             embed=utils.make_embed(
@@ -195,6 +201,7 @@ class GachaManagement(utils.Extension):
         await models.GachaConfig.prisma().update(
             data={"draw_duplicates": toggle}, where={"guild_id": ctx.guild_id}
         )
+        models.invalidate_guild_config(ctx.guild_id)
 
         await ctx.send(
             embed=utils.make_embed(
@@ -236,9 +243,7 @@ class GachaManagement(utils.Extension):
     ) -> None:
         names = await models.Names.get_or_create(ctx.guild_id)
         await models.GachaConfig.get_or_create(ctx.guild_id)
-        player = await models.GachaPlayer.get_or_create(ctx.guild_id, user.id)
-        player.currency_amount += amount
-        await player.save()
+        player = await models.GachaPlayer.add_currency(ctx.guild_id, user.id, amount)
 
         await ctx.send(
             embed=utils.make_embed(
@@ -261,9 +266,7 @@ class GachaManagement(utils.Extension):
     ) -> None:
         names = await models.Names.get_or_create(ctx.guild_id)
         await models.GachaConfig.get_or_create(ctx.guild_id)
-        player = await models.GachaPlayer.get_or_create(ctx.guild_id, user.id)
-        player.currency_amount -= amount
-        await player.save()
+        player = await models.GachaPlayer.add_currency(ctx.guild_id, user.id, -amount)
 
         await ctx.send(
             embed=utils.make_embed(
@@ -313,6 +316,7 @@ class GachaManagement(utils.Extension):
         amount = await models.ItemToPlayer.prisma().delete_many(
             where={"player": {"is": {"user_id": user.id, "guild_id": ctx.guild_id}}}
         )
+        fuzzy.invalidate_gacha_autocomplete(ctx.guild_id, user.id)
 
         if not amount:
             raise ipy.errors.BadArgument("The user has no items to reset.")
@@ -336,6 +340,7 @@ class GachaManagement(utils.Extension):
         amount = await models.GachaPlayer.prisma().delete_many(
             where={"guild_id": ctx.guild_id, "user_id": user.id},
         )
+        fuzzy.invalidate_gacha_autocomplete(ctx.guild_id, user.id)
 
         if not amount:
             raise ipy.errors.BadArgument("The user has no data to clear.")
@@ -367,6 +372,9 @@ class GachaManagement(utils.Extension):
             where={"guild_id": ctx.guild_id}
         )
 
+        self.bot.gacha_pools.invalidate(ctx.guild_id)
+        fuzzy.invalidate_gacha_autocomplete(ctx.guild_id)
+
         if items_amount <= 0:
             raise utils.CustomCheckFailure("There's no gacha item data to clear!")
 
@@ -396,6 +404,9 @@ class GachaManagement(utils.Extension):
             where={"guild_id": ctx.guild_id}
         )
 
+        self.bot.gacha_pools.invalidate(ctx.guild_id)
+        fuzzy.invalidate_gacha_autocomplete(ctx.guild_id)
+
         if players_amount + items_amount <= 0:
             raise utils.CustomCheckFailure("There's no gacha data to clear!")
 
@@ -426,35 +437,11 @@ class GachaManagement(utils.Extension):
         if actual_role is None:
             raise utils.CustomCheckFailure("The Player role was not found.")
 
-        if not ctx.guild.chunked:
-            await ctx.guild.chunk()
-            await asyncio.sleep(1)  # sometimes, it needs the wiggle room
-
-        members = actual_role.members.copy()
+        await utils.chunk_if_needed(ctx.guild)
 
-        existing_players = await models.GachaPlayer.prisma().find_many(
-            where={
-                "guild_id": ctx.guild_id,
-                "user_id": {"in": [m.id for m in members]},
-            },
+        await models.GachaPlayer.add_currency_to_many(
+            ctx.guild_id, (member.id for member in actual_role.members), amount
         )
-        existing_players_set = {p.user_id for p in existing_players}
-
-        async with self.bot.db.batch_() as batch:
-            for member in members:
-                if member.id not in existing_players_set:
-                    batch.prismagachaplayer.create(
-                        data={
-                            "guild_id": ctx.guild_id,
-                            "user_id": member.id,
-                            "currency_amount": amount,
-                        }
-                    )
-                else:
-                    batch.prismagachaplayer.update_many(
-                        where={"guild_id": ctx.guild_id, "user_id": member.id},
-                        data={"currency_amount": {"increment": amount}},
-                    )
 
         await ctx.send(
             embed=utils.make_embed(
@@ -466,26 +453,61 @@ class GachaManagement(utils.Extension):
         "list-currency-amounts",
         sub_cmd_description="Lists the currency amounts of all users.",
     )
-    async def gacha_view_all_currencies(self, ctx: utils.THIASlashContext) -> None:
+    async def gacha_view_all_currencies(
+        self,
+        ctx: utils.THIASlashContext,
+        export: bool = tansy.Option(
+            "Send the amounts as a CSV file instead. Useful for large servers.",
+            default=False,
+        ),
+    ) -> None:
         names = await models.Names.get_or_create(ctx.guild_id)
-        players = await models.GachaPlayer.prisma().find_many(
-            where={"guild_id": ctx.guild_id},
-            order={"currency_amount": "desc"},
+        player_count = await models.GachaPlayer.prisma().count(
+            where={"guild_id": ctx.guild_id}
         )
 
-        if not players:
+        if not player_count:
             raise ipy.errors.BadArgument("No users have data for gacha.")
 
-        str_build: list[str] = []
-        str_build.extend(
-            f"<@{player.user_id}> -"
-            f" {player.currency_amount} {names.currency_name(player.currency_amount)}"
-            for player in players
-        )
+        if export:
+            with await utils.export_csv(
+                "currency_amounts.csv",
+                ("user_id", "currency_amount"),
+                functools.partial(models.GachaPlayer.currency_page, ctx.guild_id),
+                lambda player: (player.user_id, player.currency_amount),
+            ) as file:
+                await ctx.send(file=file)
+            return
 
-        await ctx.send(
-            embed=utils.make_embed("\n".join(str_build), title="Gacha Currency Amounts")
+        async def fetch_page(after_id: int | None) -> tuple[str, int | None]:
+            players = await models.GachaPlayer.currency_page(
+                ctx.guild_id, after_id, take=CURRENCY_PAGE_SIZE
+            )
+            content = "\n".join(
+                f"<@{player.user_id}> -"
+                f" {player.currency_amount} {names.currency_name(player.currency_amount)}"
+                for player in players
+            )
+            return content, (
+                players[-1].id if len(players) == CURRENCY_PAGE_SIZE else None
+            )
+
+        if player_count <= CURRENCY_PAGE_SIZE:
+            content, _ = await fetch_page(None)
+            await ctx.send(
+                embed=utils.make_embed(content, title="Gacha Currency Amounts")
+            )
+            return
+
+        pag = await help_tools.LazyPaginator.create(
+            self.bot,
+            fetch_page,
+            math.ceil(player_count / CURRENCY_PAGE_SIZE),
+            timeout=120,
+            default_title="Gacha Currency Amounts",
+            default_color=self.bot.color,
         )
+        await pag.send(ctx)
 
     @manage.subcommand(
         "user-profile",
@@ -500,23 +522,12 @@ class GachaManagement(utils.Extension):
         ),
     ) -> None:
         names = await models.Names.get_or_create(ctx.guild_id)
-        player = await models.GachaPlayer.get_or_none(
-            ctx.guild_id, user.id, include={"items": {"include": {"item": True}}}
-        )
+        player = await models.GachaPlayer.get_or_none(ctx.guild_id, user.id)
 
         if player is None:
             raise ipy.errors.BadArgument("The user has no data for gacha.")
 
-        embeds = player.create_profile(user.display_name, names)
-
-        if len(embeds) > 1:
-            pag = help_tools.HelpPaginator.create_from_embeds(
-                self.bot, *embeds, timeout=120
-            )
-            pag.show_callback_button = False
-            await pag.send(ctx)
-        else:
-            await ctx.send(embeds=embeds)
+        await gacha.send_profile(ctx, player, user.display_name, names)
 
     @manage.subcommand(
         "add-item",
@@ -599,6 +610,8 @@ class GachaManagement(utils.Extension):
                 "image": image,
             }
         )
+        self.bot.gacha_pools.invalidate(ctx.guild_id)
+        fuzzy.invalidate_gacha_autocomplete(ctx.guild_id)
 
         await ctx.send(embed=utils.make_embed(f"Added item {name} to the gacha."))
 
@@ -692,6 +705,8 @@ class GachaManagement(utils.Extension):
             },
             where={"id": item_id},
         )
+        self.bot.gacha_pools.invalidate(ctx.guild_id)
+        fuzzy.invalidate_gacha_autocomplete(ctx.guild_id)
 
         await ctx.send(embed=utils.make_embed(f"Edited item {name}."))
 
@@ -710,6 +725,8 @@ class GachaManagement(utils.Extension):
         if amount <= 0:
             raise ipy.errors.BadArgument("No item with that name exists.")
 
+        self.bot.gacha_pools.invalidate(ctx.guild_id)
+        fuzzy.invalidate_gacha_autocomplete(ctx.guild_id)
         await ctx.send(f"Deleted {name}.")
 
     @manage.subcommand("view-item", sub_cmd_description="Views an item in the gacha.")
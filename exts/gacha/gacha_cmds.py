@@ -7,21 +7,19 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
+import collections
 import importlib
-import random
 
 import interactions as ipy
 import tansy
 import typing_extensions as typing
 
 import common.fuzzy as fuzzy
+import common.gacha as gacha
 import common.help_tools as help_tools
 import common.models as models
 import common.utils as utils
 
-if typing.TYPE_CHECKING:
-    from prisma.types import PrismaGachaItemWhereInput
-
 
 class GachaCommands(utils.Extension):
     def __init__(self, bot: utils.THIABase) -> None:
@@ -38,7 +36,16 @@ class GachaCommands(utils.Extension):
         "roll",
         sub_cmd_description="Rolls for an item in the gacha.",
     )
-    async def gacha_draw(self, ctx: utils.THIASlashContext) -> None:
+    async def gacha_draw(
+        self,
+        ctx: utils.THIASlashContext,
+        count: int = tansy.Option(
+            "How many times to roll. Defaults to 1.",
+            min_value=1,
+            max_value=10,
+            default=1,
+        ),
+    ) -> None:
         config = await ctx.fetch_config({"gacha": True, "names": True})
         if typing.TYPE_CHECKING:
             assert config.gacha is not None
@@ -51,58 +58,94 @@ class GachaCommands(utils.Extension):
             raise utils.CustomCheckFailure("You do not have the Player role.")
 
         player = await models.GachaPlayer.get_or_create(
-            ctx.guild.id, ctx.author.id, include={"items": True}
+            ctx.guild.id,
+            ctx.author.id,
+            include={"items": True} if not config.gacha.draw_duplicates else None,
         )
 
+        # the real check is when the currency is taken, as fewer items than
+        # asked for may be left - this just avoids drawing for nothing
         if player.currency_amount < config.gacha.currency_cost:
             raise utils.CustomCheckFailure(
-                f"You do not have enough {config.names.plural_currency_name} to roll"
-                " the gacha. You need at least"
-                f" {config.gacha.currency_cost} {config.names.currency_name(config.gacha.currency_cost)} to"
-                " do so."
+                f"You do not have enough {config.names.plural_currency_name} to"
+                " roll the gacha. You need at least"
+                f" {config.gacha.currency_cost}"
+                f" {config.names.currency_name(config.gacha.currency_cost)} to do so."
             )
 
-        where: PrismaGachaItemWhereInput = {}
-        if config.gacha.draw_duplicates:
-            where = {"guild_id": ctx.guild.id, "amount": {"not": 0}}
-        else:
-            where = {
-                "guild_id": ctx.guild.id,
-                "amount": {"not": 0},
-                "players": {"none": {"player_id": player.id}},
-            }
-
-        item_count = await models.GachaItem.prisma().count(
-            where=where,
-        )
-        if item_count == 0:
-            raise utils.CustomCheckFailure("There are no items available to roll.")
-
-        item = await models.GachaItem.prisma().find_first_or_raise(
-            skip=random.randint(0, item_count - 1),  # noqa: S311
-            where=where,
-            order={"id": "asc"},
-        )
+        owned_items: frozenset[int] = frozenset()
+        if not config.gacha.draw_duplicates:
+            owned_items = frozenset(entry.item_id for entry in player.items or ())
 
-        async with self.bot.db.batch_() as batch:
-            if item.amount != -1:
-                item.amount -= 1
-                batch.prismagachaitem.update(
-                    data={"amount": item.amount}, where={"id": item.id}
-                )
+        items: list[models.GachaItem] = []
 
-            batch.prismagachaplayer.update(
-                data={"currency_amount": {"decrement": config.gacha.currency_cost}},
-                where={"id": player.id},
-            )
-            batch.prismaitemtoplayer.create(
-                data={
-                    "item": {"connect": {"id": item.id}},
-                    "player": {"connect": {"id": player.id}},
-                }
+        # a limited item may have run out since the pool was loaded,
+        # in which case we reload it and try again
+        for _ in range(3):
+            pool = await self.bot.gacha_pools.get(ctx.guild.id)
+            items = pool.draw_many(
+                count, owned_items, duplicates=config.gacha.draw_duplicates
             )
+            if not items:
+                break
+
+            taken = collections.Counter(item.id for item in items if item.amount != -1)
+            cost = config.gacha.currency_cost * len(items)
+
+            try:
+                async with self.bot.db.tx() as tx:
+                    for item_id, amount in taken.items():
+                        if not await models.GachaItem.prisma(tx).update_many(
+                            where={"id": item_id, "amount": {"gte": amount}},
+                            data={"amount": {"decrement": amount}},
+                        ):
+                            raise gacha.StaleGachaPoolError
+
+                    if not await models.GachaPlayer.prisma(tx).update_many(
+                        where={"id": player.id, "currency_amount": {"gte": cost}},
+                        data={"currency_amount": {"decrement": cost}},
+                    ):
+                        raise utils.CustomCheckFailure(
+                            "You do not have enough"
+                            f" {config.names.plural_currency_name} to roll the"
+                            f" gacha{f' {len(items)} times' if len(items) > 1 else ''}."
+                            f" You need at least {cost}"
+                            f" {config.names.currency_name(cost)} to do so."
+                        )
+
+                    await models.ItemToPlayer.prisma(tx).create_many(
+                        data=[
+                            {"item_id": item.id, "player_id": player.id}
+                            for item in items
+                        ]
+                    )
+            except gacha.StaleGachaPoolError:
+                self.bot.gacha_pools.invalidate(ctx.guild.id)
+                items = []
+                continue
+
+            self.bot.gacha_pools.mark_taken(ctx.guild.id, items)
+            fuzzy.invalidate_gacha_autocomplete(ctx.guild.id, ctx.author.id)
+            break
+
+        if not items:
+            raise utils.CustomCheckFailure("There are no items available to roll.")
 
-        await ctx.send(embed=item.embed())
+        if len(items) == 1:
+            await ctx.send(embed=items[0].embed())
+            return
+
+        embeds: list[ipy.Embed] = []
+        for index, item in enumerate(items, start=1):
+            embed = item.embed()
+            embed.set_footer(f"Roll {index} of {len(items)}")
+            embeds.append(embed)
+
+        pag = help_tools.HelpPaginator.create_from_embeds(
+            self.bot, *embeds, timeout=120
+        )
+        pag.show_callback_button = False
+        await pag.send(ctx)
 
     @gacha.subcommand(
         "profile",
@@ -118,9 +161,7 @@ class GachaCommands(utils.Extension):
         if not config.player_role or not config.gacha.enabled:
             raise utils.CustomCheckFailure("Gacha is not enabled in this server.")
 
-        player = await models.GachaPlayer.get_or_none(
-            ctx.guild_id, ctx.author.id, include={"items": {"include": {"item": True}}}
-        )
+        player = await models.GachaPlayer.get_or_none(ctx.guild_id, ctx.author.id)
         if player is None:
             if not ctx.author.has_role(config.player_role):
                 raise ipy.errors.BadArgument("You have no data for gacha.")
@@ -128,16 +169,9 @@ class GachaCommands(utils.Extension):
                 data={"guild_id": ctx.guild_id, "user_id": ctx.author.id},
             )
 
-        embeds = player.create_profile(ctx.author.display_name, config.names)
-
-        if len(embeds) > 1:
-            pag = help_tools.HelpPaginator.create_from_embeds(
-                self.bot, *embeds, timeout=120
-            )
-            pag.show_callback_button = False
-            await pag.send(ctx, ephemeral=True)
-        else:
-            await ctx.send(embeds=embeds, ephemeral=True)
+        await gacha.send_profile(
+            ctx, player, ctx.author.display_name, config.names, ephemeral=True
+        )
 
     @gacha.subcommand(
         "give-currency",
@@ -157,36 +191,22 @@ class GachaCommands(utils.Extension):
         if not config.player_role or not config.gacha.enabled:
             raise utils.CustomCheckFailure("Gacha is not enabled in this server.")
 
-        player = await models.GachaPlayer.get_or_none(ctx.guild_id, ctx.author.id)
-        if player is None:
-            if not ctx.author.has_role(config.player_role):
-                raise ipy.errors.BadArgument("You have no data for gacha.")
-            player = await models.GachaPlayer.prisma().create(
-                data={"guild_id": ctx.guild_id, "user_id": ctx.author.id}
-            )
-
-        if player.currency_amount < amount:
-            raise utils.CustomCheckFailure("You do not have enough currency to give.")
+        # only players get data made for them automatically
+        if not recipient.has_role(config.player_role) and (
+            await models.GachaPlayer.get_or_none(ctx.guild_id, recipient.id) is None
+        ):
+            raise ipy.errors.BadArgument("The recipient has no data for gacha.")
 
-        recipient_player = await models.GachaPlayer.get_or_none(
-            ctx.guild_id, recipient.id
+        balances = await models.GachaPlayer.transfer_currency(
+            ctx.guild_id, ctx.author.id, recipient.id, amount
         )
-        if recipient_player is None:
-            if not recipient.has_role(config.player_role):
-                raise ipy.errors.BadArgument("The recipient has no data for gacha.")
-            recipient_player = await models.GachaPlayer.prisma().create(
-                data={"guild_id": ctx.guild_id, "user_id": ctx.author.id}
-            )
-
-        recipient_player.currency_amount += amount
-        player.currency_amount -= amount
-        await recipient_player.save()
-        await player.save()
+        if balances is None:
+            raise utils.CustomCheckFailure("You do not have enough currency to give.")
 
         await ctx.send(
             embed=utils.make_embed(
                 f"Gave {amount} {config.names.currency_name(amount)} to"
-                f" {recipient.mention}. New balance: {player.currency_amount}."
+                f" {recipient.mention}. New balance: {balances[0]}."
             )
         )
 
@@ -39,7 +39,7 @@ class HelpCMD(utils.Extension):
         if not argument:
             return tuple(resolved_names.values())[:25]
 
-        queried_cmds: list[list[str]] = fuzzy.extract_from_list(
+        queried_cmds = fuzzy.extract_from_list(
             argument=argument.lower(),
             list_of_items=tuple(resolved_names.keys()),
             processors=[lambda x: x.lower()],
@@ -149,8 +149,7 @@ class HelpCMD(utils.Extension):
     ) -> None:
         embeds: list[ipy.Embed] = []
 
-        if not self.bot.slash_perms_cache[int(ctx.guild_id)]:
-            await help_tools.process_bulk_slash_perms(self.bot, int(ctx.guild_id))
+        await help_tools.get_guild_slash_perms(self.bot, int(ctx.guild_id))
 
         cmds = help_tools.get_mini_commands_for_scope(self.bot, int(ctx.guild_id))
 
@@ -181,8 +180,7 @@ class HelpCMD(utils.Extension):
     ) -> None:
         query = ctx.kwargs.get("query")
 
-        if not self.bot.slash_perms_cache[int(ctx.guild_id)]:
-            await help_tools.process_bulk_slash_perms(self.bot, int(ctx.guild_id))
+        await help_tools.get_guild_slash_perms(self.bot, int(ctx.guild_id))
 
         commands = await self.extract_commands(ctx, query)
         await ctx.send([{"name": c, "value": c} for c in commands])
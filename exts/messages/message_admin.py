@@ -7,7 +7,10 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
+import contextlib
+import functools
 import importlib
+import re
 import typing
 
 import interactions as ipy
@@ -18,6 +21,18 @@ import common.models as models
 import common.utils as utils
 
 
+def parse_id(value: typing.Any) -> int | None:
+    # allows mentions too, like <@123> or <#123>
+    with contextlib.suppress(TypeError, ValueError):
+        return int(str(value).strip().strip("<@!#>"))
+    return None
+
+
+def channel_name_for(name: str) -> str:
+    # what discord turns a name into when it's used for a text channel
+    return re.sub(r"\s+", "-", name.strip().lower())
+
+
 class MessageManagement(utils.Extension):
     def __init__(self, bot: utils.THIABase) -> None:
         self.name = "Messaging Management"
@@ -73,6 +88,7 @@ class MessageManagement(utils.Extension):
         await models.MessageConfig.prisma().update(
             data={"enabled": toggle}, where={"guild_id": ctx.guild_id}
         )
+        models.invalidate_guild_config(ctx.guild_id)
 
         await ctx.send(
             embed=utils.make_embed(
@@ -102,6 +118,7 @@ class MessageManagement(utils.Extension):
         await models.MessageConfig.prisma().update(
             data={"anon_enabled": toggle}, where={"guild_id": ctx.guild_id}
         )
+        models.invalidate_guild_config(ctx.guild_id)
 
         await ctx.send(
             embed=utils.make_embed(
@@ -161,6 +178,7 @@ class MessageManagement(utils.Extension):
                     "channel_id": channel.id,
                 }
             )
+        self.bot.message_links.set_link(ctx.guild_id, user.id, channel.id)
 
         await ctx.send(
             embed=utils.make_embed(
@@ -168,10 +186,142 @@ class MessageManagement(utils.Extension):
             )
         )
 
+    @manage.subcommand(
+        "bulk-link",
+        sub_cmd_description="Creates/updates many messaging links at once.",
+    )
+    async def message_bulk_link(
+        self,
+        ctx: utils.THIASlashContext,
+        file: typing.Optional[ipy.Attachment] = tansy.Option(
+            "A CSV/JSON file of user_id and channel_id. If not given, links Players to"
+            " channels named after them.",
+            default=None,
+        ),
+    ) -> None:
+        config = await ctx.fetch_config({"messages": True})
+
+        await utils.chunk_if_needed(ctx.guild)
+
+        if file:
+            links, problems = await self.links_from_file(ctx, file)
+        else:
+            links, problems = await self.links_from_players(ctx, config)
+
+        valid_channels, invalid_channels = await utils.check_channels(
+            ctx, links.values()
+        )
+        for user_id, channel_id in tuple(links.items()):
+            if channel_id not in valid_channels:
+                problems.append(f"<@{user_id}>: {invalid_channels[channel_id]}")
+                del links[user_id]
+
+        if links:
+            await models.MessageLink.link_many(ctx.guild_id, links)
+            self.bot.message_links.invalidate(ctx.guild_id)
+
+        await ctx.send(
+            embed=utils.make_embed(
+                utils.skipped_summary(
+                    f"Created/updated {len(links)} link(s).", problems
+                )
+            )
+        )
+
+    async def links_from_file(
+        self, ctx: utils.THIASlashContext, file: ipy.Attachment
+    ) -> tuple[dict[int, int], list[str]]:
+        rows = await utils.read_import_file(self.bot, file)
+
+        links: dict[int, int] = {}
+        problems: list[str] = []
+
+        for index, row in rows:
+            user_id = parse_id(row.get("user_id"))
+            channel_id = parse_id(row.get("channel_id"))
+
+            if not user_id or not channel_id:
+                problems.append(f"Row {index}: missing or invalid user_id/channel_id.")
+            elif user_id in links:
+                problems.append(f"Row {index}: <@{user_id}> is already linked above.")
+            elif not ctx.guild.get_member(user_id):
+                problems.append(f"Row {index}: <@{user_id}> is not in this server.")
+            else:
+                links[user_id] = channel_id
+
+        return links, problems
+
+    async def links_from_players(
+        self, ctx: utils.THIASlashContext, config: models.GuildConfig
+    ) -> tuple[dict[int, int], list[str]]:
+        if not config.player_role:
+            raise utils.CustomCheckFailure(
+                "Player role not set. Please set it with"
+                f" {self.bot.mention_command('config player')} first."
+            )
+
+        actual_role = await ctx.guild.fetch_role(config.player_role)
+        if actual_role is None:
+            raise utils.CustomCheckFailure("The Player role was not found.")
+
+        channels_by_name: dict[str, list[ipy.GuildText]] = {}
+        for channel in ctx.guild.channels:
+            if isinstance(channel, ipy.GuildText):
+                channels_by_name.setdefault(channel.name, []).append(channel)
+
+        links: dict[int, int] = {}
+        problems: list[str] = []
+
+        for member in actual_role.members:
+            names = {
+                channel_name_for(member.display_name),
+                channel_name_for(member.username),
+            }
+            channel_ids = {
+                channel.id
+                for name in names
+                for channel in channels_by_name.get(name, ())
+            }
+
+            if not channel_ids:
+                problems.append(f"{member.mention}: no channel has their name.")
+            elif len(channel_ids) > 1:
+                problems.append(
+                    f"{member.mention}: more than one channel has their name."
+                )
+            else:
+                links[member.id] = channel_ids.pop()
+
+        return links, problems
+
     @manage.subcommand(
         "list-links", sub_cmd_description="Lists all messaging links for this server."
     )
-    async def message_view_links(self, ctx: utils.THIASlashContext) -> None:
+    async def message_view_links(
+        self,
+        ctx: utils.THIASlashContext,
+        export: bool = tansy.Option(
+            "Send the links as a CSV file instead, which bulk-link can import.",
+            default=False,
+        ),
+    ) -> None:
+        if export:
+            if not await models.MessageLink.prisma().count(
+                where={"guild_id": ctx.guild_id}
+            ):
+                raise utils.CustomCheckFailure(
+                    "This server has no messaging links to list."
+                )
+
+            with await utils.export_csv(
+                "messaging_links.csv",
+                ("user_id", "channel_id"),
+                functools.partial(models.MessageLink.links_page, ctx.guild_id),
+                lambda link: (link.user_id, link.channel_id),
+            ) as file:
+                await ctx.send(file=file)
+            return
+
         links = await models.MessageLink.prisma().find_many(
             where={"guild_id": ctx.guild_id}
         )
@@ -216,6 +366,7 @@ class MessageManagement(utils.Extension):
         num_deleted = await models.MessageLink.prisma().delete_many(
             where={"guild_id": ctx.guild_id, "user_id": user.id}
         )
+        self.bot.message_links.remove_link(ctx.guild_id, user.id)
 
         if num_deleted < 1:
             raise utils.CustomCheckFailure("There's no messaging link to remove!")
@@ -245,6 +396,7 @@ class MessageManagement(utils.Extension):
         num_deleted = await models.MessageLink.prisma().delete_many(
             where={"guild_id": ctx.guild_id}
         )
+        self.bot.message_links.invalidate(ctx.guild_id)
 
         if num_deleted < 1:
             raise utils.CustomCheckFailure("There's no messaging links to clear!")
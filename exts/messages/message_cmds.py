@@ -14,7 +14,7 @@ import interactions as ipy
 import tansy
 
 import common.help_tools as help_tools
-import common.models as models
+import common.messaging as messaging
 import common.utils as utils
 
 
@@ -22,8 +22,7 @@ async def prefixed_check(ctx: utils.THIAHybridContext) -> bool:
     if isinstance(ctx.inner_context, ipy.SlashContext):
         return True
 
-    if not ctx.bot.slash_perms_cache[int(ctx.guild_id)]:
-        await help_tools.process_bulk_slash_perms(ctx.bot, int(ctx.guild_id))
+    await help_tools.get_guild_slash_perms(ctx.bot, int(ctx.guild_id))
 
     cmds = help_tools.get_mini_commands_for_scope(ctx.bot, int(ctx.guild_id))
 
@@ -42,21 +41,14 @@ class MessageCMDs(utils.Extension):
         aliases=["msg"],
     )
 
-    @message.subcommand(
-        "send",
-        sub_cmd_description=(
-            "Non-anonymously message another player's designated channel."
-        ),
-        aliases=["whisper"],
-    )
-    @ipy.auto_defer(enabled=False)
-    async def message_whisper(
+    async def relay_message(
         self,
         ctx: utils.THIAHybridContext,
-        user: ipy.Member = tansy.Option("The user to message."),
-        message: ipy.ConsumeRest[str] = tansy.Option("The message to send."),
+        user: ipy.Member,
+        message: str,
+        *,
+        anonymous: bool,
     ) -> None:
-        ctx.ephemeral = True
         async with ctx.typing:
             if not await prefixed_check(ctx):
                 raise utils.CustomCheckFailure(
@@ -71,45 +63,71 @@ class MessageCMDs(utils.Extension):
                 raise utils.CustomCheckFailure(
                     "The messaging system is not enabled for this server."
                 )
+            if anonymous and not config.messages.anon_enabled:
+                raise utils.CustomCheckFailure(
+                    "Anonymous messages are not enabled for this server."
+                )
 
-            ctx_user_link = await models.MessageLink.prisma().find_first(
-                where={"guild_id": ctx.guild_id, "user_id": ctx.author_id}
+            ctx_user_chan_id, other_chan_id = await self.bot.message_links.resolve(
+                ctx.guild_id, ctx.author_id, user.id
             )
-            if not ctx_user_link:
+            if not ctx_user_chan_id:
                 raise utils.CustomCheckFailure(
                     "You are not set up with the messaging system."
                 )
-
-            other_user_link = await models.MessageLink.prisma().find_first(
-                where={"guild_id": ctx.guild_id, "user_id": user.id}
-            )
-            if not other_user_link:
+            if not other_chan_id:
                 raise ipy.errors.BadArgument(
                     "The specified user is not set up with the messaging system."
                 )
 
-            embed = utils.make_embed(message, title=f"Message from {ctx.author!s}")
+            # unique per use of the command, so that queueing the same use twice
+            # doesn't send its message twice
+            if isinstance(ctx.inner_context, ipy.SlashContext):
+                ctx_id = str(ctx.inner_context.id)
+            else:
+                ctx_id = str(ctx.inner_context.message.id)
+            sender_name = (
+                "Anonymous message" if anonymous else f"Message from {ctx.author!s}"
+            )
 
-            try:
-                other_chan = utils.partial_channel(self.bot, other_user_link.channel_id)
-                await other_chan.send(embed=embed)
-            except ipy.errors.HTTPException:
-                raise utils.CustomCheckFailure(
-                    "Could not send a message to the specified user's channel."
-                ) from None
+            await self.bot.message_outbox.enqueue(
+                ctx.guild_id,
+                messaging.OutgoingMessage(
+                    ctx_id,
+                    other_chan_id,
+                    sender_name,
+                    message,
+                    sender_channel_id=ctx_user_chan_id,
+                    receipt_title=(
+                        f"Anonymous message sent to {user!s}"
+                        if anonymous
+                        else f"Message sent to {user!s}"
+                    ),
+                ),
+            )
 
-            try:
-                ctx_user_chan = utils.partial_channel(
-                    self.bot, ctx_user_link.channel_id
-                )
-                embed.title = f"Message sent to {user!s}"
-                await ctx_user_chan.send(embed=embed)
-            except ipy.errors.HTTPException:
-                raise utils.CustomCheckFailure(
-                    "Message sent, but could not send receipt to your channel."
-                ) from None
+        await ctx.reply(
+            "Message queued! A receipt will be sent to your channel once it's"
+            " delivered.",
+            ephemeral=True,
+        )
 
-        await ctx.reply("Sent!", ephemeral=True)
+    @message.subcommand(
+        "send",
+        sub_cmd_description=(
+            "Non-anonymously message another player's designated channel."
+        ),
+        aliases=["whisper"],
+    )
+    @ipy.auto_defer(enabled=False)
+    async def message_whisper(
+        self,
+        ctx: utils.THIAHybridContext,
+        user: ipy.Member = tansy.Option("The user to message."),
+        message: ipy.ConsumeRest[str] = tansy.Option("The message to send."),
+    ) -> None:
+        ctx.ephemeral = True
+        await self.relay_message(ctx, user, message, anonymous=False)
 
     @message.subcommand(
         "anon",
@@ -123,63 +141,7 @@ class MessageCMDs(utils.Extension):
         message: ipy.ConsumeRest[str] = tansy.Option("The message to send."),
     ) -> None:
         ctx.ephemeral = True
-        async with ctx.typing:
-            if not await prefixed_check(ctx):
-                raise utils.CustomCheckFailure(
-                    "You do not have the proper permissions to use that command."
-                )
-
-            config = await ctx.fetch_config({"messages": True})
-            if typing.TYPE_CHECKING:
-                assert config.messages is not None
-
-            if not config.messages.enabled:
-                raise utils.CustomCheckFailure(
-                    "The messaging system is not enabled for this server."
-                )
-            if not config.messages.anon_enabled:
-                raise utils.CustomCheckFailure(
-                    "Anonymous messages are not enabled for this server."
-                )
-
-            ctx_user_link = await models.MessageLink.prisma().find_first(
-                where={"guild_id": ctx.guild_id, "user_id": ctx.author_id}
-            )
-            if not ctx_user_link:
-                raise utils.CustomCheckFailure(
-                    "You are not set up with the messaging system."
-                )
-
-            other_user_link = await models.MessageLink.prisma().find_first(
-                where={"guild_id": ctx.guild_id, "user_id": user.id}
-            )
-            if not other_user_link:
-                raise ipy.errors.BadArgument(
-                    "The specified user is not set up with the messaging system."
-                )
-
-            embed = utils.make_embed(message, title="Anonymous message")
-
-            try:
-                other_chan = utils.partial_channel(self.bot, other_user_link.channel_id)
-                await other_chan.send(embed=embed)
-            except ipy.errors.HTTPException:
-                raise utils.CustomCheckFailure(
-                    "Could not send a message to the specified user's channel."
-                ) from None
-
-            try:
-                ctx_user_chan = utils.partial_channel(
-                    self.bot, ctx_user_link.channel_id
-                )
-                embed.title = f"Anonymous message sent to {user!s}"
-                await ctx_user_chan.send(embed=embed)
-            except ipy.errors.HTTPException:
-                raise utils.CustomCheckFailure(
-                    "Message sent, but could not send receipt to your channel."
-                ) from None
-
-        await ctx.reply("Sent!", ephemeral=True)
+        await self.relay_message(ctx, user, message, anonymous=True)
 
 
 def setup(bot: utils.THIABase) -> None:
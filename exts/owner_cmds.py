@@ -17,11 +17,14 @@ import textwrap
 import traceback
 import weakref
 
+import humanize
 import interactions as ipy
 import typing_extensions as typing
 from interactions.ext import paginators
 from interactions.ext import prefixed_commands as prefixed
 
+import common.caches as caches
+import common.help_tools as help_tools
 import common.utils as utils
 
 
@@ -42,16 +45,17 @@ def debug_embed(title: str, **kwargs: typing.Any) -> ipy.Embed:
 
 def get_cache_state(bot: "ipy.Client") -> str:
     """Create a nicely formatted table of internal cache state."""
-    caches = {
+    cache_dict = {
         c[0]: getattr(bot.cache, c[0])
         for c in inspect.getmembers(bot.cache, predicate=lambda x: isinstance(x, dict))
         if not c[0].startswith("__")
     }
-    caches["endpoints"] = bot.http._endpoints
-    caches["rate_limits"] = bot.http.ratelimit_locks
+    cache_dict["endpoints"] = bot.http._endpoints
+    cache_dict["rate_limits"] = bot.http.ratelimit_locks
+    cache_dict |= caches.REGISTERED_CACHES
     table = []
 
-    for cache, val in caches.items():
+    for cache, val in cache_dict.items():
         if isinstance(val, ipy.utils.TTLCache):
             amount = [len(val), f"{val.hard_limit}({val.soft_limit})"]
             expire = f"{val.ttl}s"
@@ -65,12 +69,18 @@ def get_cache_state(bot: "ipy.Client") -> str:
             amount = [len(val), "∞"]
             expire = "none"
 
-        row = [cache.removesuffix("_cache"), amount, expire]
+        if isinstance(val, caches.StatsTTLCache):
+            hits = [val.hits, val.misses]
+        else:
+            hits = ["-", "-"]
+
+        row = [cache.removesuffix("_cache"), amount, expire, hits]
         table.append(row)
 
     adjust_subcolumn(table, 1, aligns=[">", "<"])
+    adjust_subcolumn(table, 3, aligns=[">", "<"])
 
-    labels = ["Cache", "Amount", "Expire"]
+    labels = ["Cache", "Amount", "Expire", "Hits/Misses"]
     return make_table(table, labels)
 
 
@@ -222,6 +232,10 @@ class OwnerCMDs(ipy.Extension):
         e = debug_embed("Cache")
 
         e.description = f"```prolog\n{get_cache_state(self.bot)}\n```"
+        e.add_field(
+            "Slash Permissions Memory",
+            humanize.naturalsize(help_tools.slash_perms_memory(self.bot), binary=True),
+        )
         await ctx.reply(embeds=[e])
 
     @debug.subcommand()
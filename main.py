@@ -14,7 +14,6 @@ import logging
 import os
 import subprocess
 import sys
-from collections import defaultdict
 
 import interactions as ipy
 import sentry_sdk
@@ -26,9 +25,13 @@ from load_env import load_env
 
 load_env()
 
+import common.caches as caches
 import common.classes as cclasses
+import common.gacha as gacha
 import common.help_tools as help_tools
+import common.messaging as messaging
 import common.models as models
+import common.triggers as triggers
 import common.utils as utils
 
 if typing.TYPE_CHECKING:
@@ -173,18 +176,36 @@ class PYTHIA(utils.THIABase):
         data: discord_typings.GuildApplicationCommandPermissionData = event.data  # type: ignore
 
         guild_id = int(data["guild_id"])
+        help_tools.invalidate_can_run(guild_id)
 
-        if not self.slash_perms_cache[guild_id]:
-            await help_tools.process_bulk_slash_perms(self, guild_id)
+        # no point loading a guild's permissions just to update them
+        if (guild_perms := self.slash_perms_cache.peek(guild_id)) is None:
             return
 
         cmds = help_tools.get_commands_for_scope_by_ids(self, guild_id)
         if cmd := cmds.get(int(data["id"])):
-            self.slash_perms_cache[guild_id][
-                int(data["id"])
-            ] = help_tools.PermissionsResolver(
-                cmd.default_member_permissions, guild_id, data["permissions"]  # type: ignore
-            )
+            if data["permissions"]:
+                guild_perms[int(data["id"])] = help_tools.PermissionsResolver(
+                    cmd.default_member_permissions, guild_id, data["permissions"]  # type: ignore
+                )
+            else:
+                guild_perms.pop(int(data["id"]), None)
+
+    # commands are the same for every guild, so the help command's tree of
+    # them is built once up front and rebuilt whenever they change
+    @ipy.listen("extension_load")
+    async def on_extension_load(self) -> None:
+        help_tools.rebuild_mini_commands(self)
+
+    @ipy.listen("extension_unload")
+    async def on_extension_unload(self) -> None:
+        help_tools.rebuild_mini_commands(self)
+
+    @ipy.listen("callback_added")
+    async def on_callback_added(self, event: ipy.events.CallbackAdded) -> None:
+        # extensions are handled when they finish loading
+        if not event.extension and isinstance(event.callback, ipy.SlashCommand):
+            self.mini_commands_per_scope.clear()
 
     @ipy.listen(is_default_listener=True)
     async def on_error(self, event: ipy.events.Error) -> None:
@@ -203,6 +224,8 @@ class PYTHIA(utils.THIABase):
         return task
 
     async def stop(self) -> None:
+        # anything unsent stays queued for the next start
+        self.message_outbox.stop()
         await self.db.disconnect()
         await super().stop()
 
@@ -238,10 +261,19 @@ bot = PYTHIA(
     logger=logger,
 )
 bot.init_load = True
-bot.slash_perms_cache = defaultdict(dict)
+# guilds that haven't used commands in a while are dropped, and fetched again if needed
+bot.slash_perms_cache = caches.StatsTTLCache(
+    "slash_perms", ttl=21600, hard_limit=2500, refresh_on_get=True
+)
 bot.mini_commands_per_scope = {}
 bot.background_tasks = set()
 bot.msg_enabled_bullets_guilds = set()
+bot.bullet_triggers = triggers.ChannelTriggerIndex()
+bot.unfound_bullet_channels = set()
+bot.gacha_pools = gacha.GachaPools()
+bot.message_links = messaging.MessageLinks()
+bot.message_relay = messaging.MessageRelay()
+bot.message_outbox = messaging.MessageOutbox(bot)
 bot.color = ipy.Color(int(os.environ["BOT_COLOR"]))  # #723fb0 or 7487408
 prefixed.setup(bot, prefixed_context=utils.THIAPrefixedContext)
 cclasses.PatchedHybridManager(bot, hybrid_context=utils.THIAHybridContext)
@@ -264,6 +296,10 @@ async def start() -> None:
     ):
         bot.msg_enabled_bullets_guilds.add(model.guild_id)
 
+    bot.unfound_bullet_channels.update(await models.TruthBullet.unfound_channel_ids())
+
+    bot.message_outbox.start()
+
     ext_list = utils.get_all_extensions(os.environ["DIRECTORY_OF_FILE"])
     for ext in ext_list:
         if "voting" in ext and not utils.VOTING_ENABLED:
@@ -0,0 +1,34 @@
+-- Merge duplicate players into the oldest row for each guild and user
+CREATE TEMPORARY TABLE "_thiagachaplayers_dupes" AS
+SELECT
+    "id",
+    MIN("id") OVER (PARTITION BY "guild_id", "user_id") AS "keep_id"
+FROM "thiagachaplayers";
+
+DELETE FROM "_thiagachaplayers_dupes" WHERE "id" = "keep_id";
+
+UPDATE "thiagachaplayers" AS "player"
+SET "currency_amount" = "player"."currency_amount" + "merged"."total"
+FROM (
+    SELECT "dupes"."keep_id", SUM("dupe"."currency_amount") AS "total"
+    FROM "_thiagachaplayers_dupes" AS "dupes"
+    JOIN "thiagachaplayers" AS "dupe" ON "dupe"."id" = "dupes"."id"
+    GROUP BY "dupes"."keep_id"
+) AS "merged"
+WHERE "player"."id" = "merged"."keep_id";
+
+UPDATE "thiagachaitemtoplayer" AS "entry"
+SET "player_id" = "dupes"."keep_id"
+FROM "_thiagachaplayers_dupes" AS "dupes"
+WHERE "entry"."player_id" = "dupes"."id";
+
+DELETE FROM "thiagachaplayers"
+WHERE "id" IN (SELECT "id" FROM "_thiagachaplayers_dupes");
+
+DROP TABLE "_thiagachaplayers_dupes";
+
+-- DropIndex
+DROP INDEX "thiagachaplayers_guild_id_user_id_idx";
+
+-- CreateIndex
+CREATE UNIQUE INDEX "thiagachaplayers_guild_id_user_id_key" ON "thiagachaplayers"("guild_id", "user_id");
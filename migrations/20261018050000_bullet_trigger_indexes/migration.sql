@@ -0,0 +1,17 @@
+-- Trigram matching, used by autocomplete for channels with many Truth Bullets
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
+
+-- Lowercases every element of an array, so that aliases can be indexed and
+-- compared case-insensitively
+CREATE OR REPLACE FUNCTION "thia_lower_array"(TEXT[]) RETURNS TEXT[]
+LANGUAGE SQL IMMUTABLE STRICT PARALLEL SAFE
+AS $$ SELECT COALESCE(ARRAY_AGG(LOWER("value")), '{}') FROM UNNEST($1) AS "value" $$;
+
+-- CreateIndex
+CREATE INDEX "thiatruthbullets_channel_id_lower_trigger_idx" ON "thiatruthbullets"("channel_id", LOWER("trigger"));
+
+-- CreateIndex
+CREATE INDEX "thiatruthbullets_lower_aliases_idx" ON "thiatruthbullets" USING GIN ("thia_lower_array"("aliases"::TEXT[]));
+
+-- CreateIndex
+CREATE INDEX "thiatruthbullets_lower_trigger_trgm_idx" ON "thiatruthbullets" USING GIN (LOWER("trigger") gin_trgm_ops);
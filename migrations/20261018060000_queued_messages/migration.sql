@@ -0,0 +1,26 @@
+-- CreateTable
+CREATE TABLE "thiaqueuedmessages" (
+    "id" SERIAL NOT NULL,
+    "idempotency_key" VARCHAR(25) NOT NULL,
+    "guild_id" BIGINT NOT NULL,
+    "channel_id" BIGINT NOT NULL,
+    "title" TEXT NOT NULL,
+    "description" TEXT NOT NULL,
+    "sender_channel_id" BIGINT,
+    "receipt_title" TEXT,
+    "attempts" INTEGER NOT NULL DEFAULT 0,
+    "next_attempt_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "locked_until" TIMESTAMP(3),
+    "created_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "thiaqueuedmessages_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE UNIQUE INDEX "thiaqueuedmessages_idempotency_key_key" ON "thiaqueuedmessages"("idempotency_key");
+
+-- CreateIndex
+CREATE INDEX "thiaqueuedmessages_next_attempt_at_idx" ON "thiaqueuedmessages"("next_attempt_at");
+
+-- CreateIndex
+CREATE INDEX "thiaqueuedmessages_channel_id_idx" ON "thiaqueuedmessages"("channel_id");